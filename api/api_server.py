@@ -1,15 +1,30 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, request, jsonify, send_file
+from werkzeug.exceptions import HTTPException
 import os
 import sys
 import tempfile
 import shutil
 import uuid
+import json
+import hashlib
+import math
+import time
 import requests
-import base64
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import binascii
+from urllib.parse import urlparse
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List, Union, Mapping, Tuple
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import multiprocessing
+import threading
 import traceback
 import logging
+import logging.handlers
+import queue
+import atexit
 
 # 添加项目根目录到Python路径
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -17,49 +32,392 @@ parent_dir = os.path.dirname(current_dir)
 sys.path.insert(0, parent_dir)
 
 # 导入项目现有模块
-from src.services.video_service import VideoService
+from src.services.video_service import VideoService, render_preview_clip, init_render_worker
 from src.services.path_service import PathService
 from src.services.animation_service import AnimationService
 from src.services.transition_service import TransitionService
 
 app = Flask(__name__)
 
-# 配置日志
+# 日志目录
 log_dir = os.path.join(current_dir, 'logs')
-os.makedirs(log_dir, exist_ok=True)
-logging.basicConfig(
-    filename=os.path.join(log_dir, 'api.log'),
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger('image2video_api')
 
-# 初始化服务
-try:
-    video_service = VideoService()
-    animation_service = AnimationService()
-    logger.info("服务初始化成功")
-except Exception as e:
-    logger.error(f"服务初始化失败: {str(e)}")
-    traceback.print_exc()
+# 日志处理器和写日志的后台线程，由_init_server创建
+_log_file_handler = None
+_log_queue_handler = None
+_log_listener = None
+
+def _start_log_listener() -> None:
+    """
+    启动把队列中的日志写入文件的后台线程
+    
+    fork出的子进程（如gunicorn --preload的工作进程）中没有父进程的后台线程，
+    复制来的队列状态也不可靠，需要使用新的队列重新启动
+    """
+    global _log_listener
+    if _log_listener is not None:
+        _log_queue_handler.queue = queue.SimpleQueue()
+    _log_listener = logging.handlers.QueueListener(
+        _log_queue_handler.queue, _log_file_handler, respect_handler_level=True
+    )
+    _log_listener.start()
 
 # 配置上传和输出目录
 UPLOAD_FOLDER = Path(os.path.join(current_dir, 'api_uploads'))
 OUTPUT_FOLDER = Path(os.path.join(current_dir, 'api_output'))
 TEMP_FOLDER = Path(os.path.join(current_dir, 'api_temp'))
 
-# 创建必要的目录
-UPLOAD_FOLDER.mkdir(exist_ok=True)
-OUTPUT_FOLDER.mkdir(exist_ok=True)
-TEMP_FOLDER.mkdir(exist_ok=True)
+# 下载缓存目录：以URL的SHA-256命名，重复请求同一URL时直接使用本地文件
+DOWNLOAD_CACHE_FOLDER = UPLOAD_FOLDER / '_cache'
+
+# 服务实例，由_init_server创建
+video_service = None
+animation_service = None
+
+def _init_server() -> None:
+    """
+    配置日志、创建目录并初始化服务
+    
+    只在API服务进程中执行。以脚本方式运行时，编码进程池的spawn子进程会以__mp_main__的名字
+    重新导入本模块，这些进程只执行render_preview_clip，不需要日志线程、目录和服务实例
+    """
+    global _log_file_handler, _log_queue_handler, video_service, animation_service
+    
+    # 配置日志
+    os.makedirs(log_dir, exist_ok=True)
+    # 请求线程只把日志记录放入队列，由后台线程统一写入文件，避免请求线程争用文件锁
+    _log_file_handler = logging.FileHandler(os.path.join(log_dir, 'api.log'), encoding='utf-8', delay=True)
+    _log_file_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    _log_queue_handler = logging.handlers.QueueHandler(queue.SimpleQueue())
+    # 入队时只合并消息参数，完整格式由写文件的处理器统一添加
+    _log_queue_handler.setFormatter(logging.Formatter('%(message)s'))
+    logging.basicConfig(level=logging.INFO, handlers=[_log_queue_handler])
+    
+    _start_log_listener()
+    # 退出时写完队列中剩余的日志
+    atexit.register(lambda: _log_listener.stop())
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=_start_log_listener)
+    
+    # 初始化服务
+    try:
+        video_service = VideoService()
+        animation_service = AnimationService()
+        logger.info("服务初始化成功")
+    except Exception as e:
+        logger.error(f"服务初始化失败: {str(e)}")
+        traceback.print_exc()
+    
+    # 创建必要的目录
+    UPLOAD_FOLDER.mkdir(exist_ok=True)
+    OUTPUT_FOLDER.mkdir(exist_ok=True)
+    TEMP_FOLDER.mkdir(exist_ok=True)
+    DOWNLOAD_CACHE_FOLDER.mkdir(exist_ok=True)
+    
+    logger.info(f"上传目录: {UPLOAD_FOLDER}")
+    logger.info(f"输出目录: {OUTPUT_FOLDER}")
+    logger.info(f"临时目录: {TEMP_FOLDER}")
+
+if __name__ != '__mp_main__':
+    _init_server()
+
+# 并发下载的最大线程数
+MAX_DOWNLOAD_WORKERS = 16
+# 下载时每次读取的数据块大小（1 MiB），减少Python层的循环次数
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+# 下载缓存最多保留的文件数，超出后按最近使用时间淘汰
+MAX_CACHED_DOWNLOADS = 256
+# 超过该大小且服务器支持Range请求的文件，拆分为多段并行下载
+RANGED_DOWNLOAD_THRESHOLD = 8 * 1024 * 1024
+# 分段下载的段数
+RANGED_DOWNLOAD_PARTS = 4
+# 可以直接沿用URL中扩展名的文件类型，其他扩展名按Content-Type推断，
+# 避免URL中的".meta"、".part"等扩展名与缓存的元数据和临时文件重名
+DOWNLOAD_EXTENSIONS = {'.mp4', '.mov', '.webm', '.jpg', '.jpeg', '.png', '.gif', '.mp3', '.m4a', '.wav'}
+# 请求体的最大长度，超出时在读取请求体之前直接返回413
+MAX_REQUEST_SIZE = 20 * 1024 * 1024
+app.config['MAX_CONTENT_LENGTH'] = MAX_REQUEST_SIZE
+# 单个图片视频的最大时长（秒）
+MAX_CLIP_DURATION = 600.0
+# 视频转场的最大时长（秒）
+MAX_TRANSITION_DURATION = 10.0
+# 可选的输出质量
+OUTPUT_QUALITIES = ('low', 'medium', 'high')
+# 服务的工作进程数。gunicorn未指定--workers时以环境变量WEB_CONCURRENCY作为工作进程数，
+# 部署时只通过该变量设置，编码进程按它分配
+SERVER_WORKERS = max(1, int(os.environ.get('WEB_CONCURRENCY', '1')))
+# 每个工作进程同时进行视频编码的最大进程数，超出的请求排队等待。
+# 整个服务的编码进程总数上限为CPU核心数的一半，由各工作进程平分；
+# 每个工作进程至少保留1个，工作进程数多于核心数的一半时总数等于工作进程数
+MAX_ENCODE_WORKERS = max(1, (os.cpu_count() or 2) // 2 // SERVER_WORKERS)
+# 单个视频编码的最长等待时间（秒）
+ENCODE_TIMEOUT = 300
+# 前端Nginx中映射到输出目录的internal location（如"/_videos/"）。
+# 设置后视频文件交由Nginx通过X-Accel-Redirect直接发送，Flask只返回响应头
+VIDEO_ACCEL_REDIRECT_PREFIX = os.environ.get('VIDEO_ACCEL_REDIRECT_PREFIX', '')
+
+# 全局复用的HTTP会话：连接池保持长连接，重复下载同一主机时免去TCP/TLS握手
+http_session = requests.Session()
+_http_adapter = HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=32,
+    max_retries=Retry(total=3, backoff_factor=0.2)
+)
+http_session.mount('http://', _http_adapter)
+http_session.mount('https://', _http_adapter)
+# 媒体文件本身已经压缩，不需要再进行传输压缩
+http_session.headers.update({'Accept-Encoding': 'identity', 'Connection': 'keep-alive'})
+
+# 使用gunicorn --preload时工作进程由主进程fork而来，子进程不能与父进程共用已建立的连接
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_http_adapter.poolmanager.clear)
+
+# 视频编码进程池，在每个服务进程中首次使用时创建
+_encode_pool = None
+_encode_pool_pid = None
+_encode_pool_lock = threading.Lock()
+
+def get_encode_pool() -> ProcessPoolExecutor:
+    """
+    获取当前进程的视频编码进程池
+    
+    进程池在首次使用时创建；如果服务进程是fork出来的（如gunicorn的worker），
+    会重新创建属于自己的进程池，而不是使用父进程中无法工作的进程池
+    
+    Returns:
+        视频编码进程池
+    """
+    global _encode_pool, _encode_pool_pid
+    with _encode_pool_lock:
+        if _encode_pool is None or _encode_pool_pid != os.getpid():
+            # 服务进程是多线程的，使用spawn启动工作进程，避免fork时复制线程持有的锁
+            _encode_pool = ProcessPoolExecutor(
+                max_workers=MAX_ENCODE_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=init_render_worker,
+                initargs=(MAX_ENCODE_WORKERS,)
+            )
+            _encode_pool_pid = os.getpid()
+        return _encode_pool
+
+def _preallocate(fd: int, size: int) -> None:
+    """
+    为即将写入的文件预先分配磁盘空间
+    
+    Args:
+        fd: 已打开的文件描述符
+        size: 预计写入的字节数，未知时为0
+    """
+    if size <= 0 or not hasattr(os, 'posix_fallocate'):
+        return
+    try:
+        os.posix_fallocate(fd, 0, size)
+    except OSError:
+        # 部分文件系统不支持预分配，直接按普通方式写入
+        pass
+
+def _prefetch_file(path: Path) -> None:
+    """
+    提示内核提前把整个文件异步读入页缓存
+    
+    WILLNEED提示会立即发起预读，读入的是文件本身的页缓存，关闭描述符后仍然有效，
+    之后无论由Flask还是Nginx发送文件，都能直接从内存读取
+    
+    Args:
+        path: 文件路径
+    """
+    if not hasattr(os, 'posix_fadvise'):
+        return
+    try:
+        fd = os.open(str(path), os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        finally:
+            os.close(fd)
+    except OSError:
+        # 只是性能提示，失败时按普通方式读取
+        pass
 
-logger.info(f"上传目录: {UPLOAD_FOLDER}")
-logger.info(f"输出目录: {OUTPUT_FOLDER}")
-logger.info(f"临时目录: {TEMP_FOLDER}")
+def _download_range(url: str, fd: int, start: int, end: int) -> None:
+    """
+    下载文件的一个字节区间，并写入到文件的对应位置
+    
+    Args:
+        url: 文件URL
+        fd: 目标文件的文件描述符
+        start: 区间起始字节（包含）
+        end: 区间结束字节（包含）
+    """
+    with http_session.get(url, headers={'Range': f'bytes={start}-{end}'}, stream=True) as response:
+        response.raise_for_status()
+        if response.status_code != 206:
+            raise IOError(f"服务器未按Range返回数据: {response.status_code}")
+        
+        offset = start
+        for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+            os.pwrite(fd, chunk, offset)
+            offset += len(chunk)
+    
+    if offset != end + 1:
+        raise IOError(f"分段下载不完整: bytes={start}-{end}, 实际结束于{offset}")
+
+def _download_ranges(url: str, local_path: Path, total_size: int) -> None:
+    """
+    将大文件拆分为多个字节区间并行下载
+    
+    单个TCP连接的吞吐受拥塞控制限制，多个连接并行可以更充分地利用带宽
+    
+    Args:
+        url: 文件URL
+        local_path: 保存路径
+        total_size: 文件总字节数
+    """
+    part_size = -(-total_size // RANGED_DOWNLOAD_PARTS)
+    ranges = [(start, min(start + part_size, total_size) - 1) for start in range(0, total_size, part_size)]
+    
+    fd = os.open(local_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        _preallocate(fd, total_size)
+        with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+            futures = [executor.submit(_download_range, url, fd, start, end) for start, end in ranges]
+            for future in futures:
+                future.result()
+    finally:
+        os.close(fd)
+
+def _download_stream(response, local_path: Path, total_size: int) -> None:
+    """
+    将HTTP响应流式写入文件
+    
+    Args:
+        response: 以stream=True发起的HTTP响应
+        local_path: 保存路径
+        total_size: 响应头中的文件长度，未知时为0
+    """
+    with open(local_path, 'wb') as f:
+        # 预先分配磁盘空间，写入时不再逐块分配
+        _preallocate(f.fileno(), total_size)
+        # 从urllib3的原始响应按DOWNLOAD_CHUNK_SIZE大块读取后直接写入文件。复制仍是Python层的
+        # 读写循环，但块很大，循环次数很少；会话请求identity编码，数据通常不需要解压，
+        # 服务器仍返回压缩内容时由decode_content负责解压
+        response.raw.decode_content = True
+        shutil.copyfileobj(response.raw, f, length=DOWNLOAD_CHUNK_SIZE)
+        # 以实际写入的长度为准，避免预分配多出的尾部
+        f.truncate()
+
+def _lookup_download_cache(cache_key: str) -> Optional[str]:
+    """
+    查找URL对应的已缓存文件
+    
+    Args:
+        cache_key: URL的SHA-256摘要
+        
+    Returns:
+        缓存文件路径，未命中或缓存无效时返回None
+    """
+    meta_path = DOWNLOAD_CACHE_FOLDER / f"{cache_key}.meta"
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        cached_path = DOWNLOAD_CACHE_FOLDER / meta['filename']
+        size = cached_path.stat().st_size
+    except (OSError, ValueError, KeyError):
+        return None
+    
+    # 空文件或长度与下载时不一致的文件视为无效
+    if size == 0 or (meta.get('content_length') and meta['content_length'] != size):
+        return None
+    
+    # 更新访问时间，用于按最近使用淘汰
+    os.utime(meta_path)
+    return str(cached_path)
+
+def _store_download_cache(cache_key: str, url: str, cached_path: Path, etag: Optional[str]) -> None:
+    """
+    记录缓存文件的元数据，并淘汰超出数量上限的旧缓存
+    
+    Args:
+        cache_key: URL的SHA-256摘要
+        url: 文件URL
+        cached_path: 已下载的缓存文件路径
+        etag: 下载时响应头中的ETag
+    """
+    meta = {
+        'url': url,
+        'filename': cached_path.name,
+        'etag': etag,
+        'content_length': cached_path.stat().st_size
+    }
+    meta_path = DOWNLOAD_CACHE_FOLDER / f"{cache_key}.meta"
+    tmp_meta_path = DOWNLOAD_CACHE_FOLDER / f"{cache_key}.{uuid.uuid4().hex}.meta.part"
+    with open(tmp_meta_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    os.replace(tmp_meta_path, meta_path)
+    
+    # 淘汰最久未使用的缓存
+    entries = [entry for entry in os.scandir(DOWNLOAD_CACHE_FOLDER) if entry.name.endswith('.meta')]
+    if len(entries) <= MAX_CACHED_DOWNLOADS:
+        return
+    entries.sort(key=lambda entry: entry.stat().st_mtime)
+    # 一个请求最长的处理时间（ENCODE_TIMEOUT）内用过的缓存可能仍在被读取，不淘汰
+    recent = time.time() - ENCODE_TIMEOUT
+    for entry in entries[:len(entries) - MAX_CACHED_DOWNLOADS]:
+        try:
+            if entry.stat().st_mtime >= recent:
+                break
+            with open(entry.path, 'r', encoding='utf-8') as f:
+                stale_filename = json.load(f).get('filename')
+        except OSError:
+            continue
+        except ValueError:
+            # 元数据已损坏，只删除元数据文件
+            stale_filename = None
+        # 只删除该缓存项自己的元数据和数据文件，不影响同一前缀的其他文件
+        stale_files = [entry.path]
+        if stale_filename:
+            stale_files.append(DOWNLOAD_CACHE_FOLDER / stale_filename)
+        for stale_file in stale_files:
+            try:
+                os.unlink(stale_file)
+            except OSError:
+                pass
+
+def _guess_extension(content_type: str) -> str:
+    """
+    根据响应的内容类型推断文件扩展名
+    
+    Args:
+        content_type: Content-Type响应头
+        
+    Returns:
+        文件扩展名（包含点号）
+    """
+    if 'image' in content_type:
+        if 'jpeg' in content_type or 'jpg' in content_type:
+            return '.jpg'
+        elif 'png' in content_type:
+            return '.png'
+        return '.jpg'  # 默认jpg
+    elif 'audio' in content_type:
+        if 'mp3' in content_type:
+            return '.mp3'
+        elif 'wav' in content_type:
+            return '.wav'
+        return '.mp3'  # 默认mp3
+    elif 'video' in content_type:
+        if 'webm' in content_type:
+            return '.webm'
+        elif 'quicktime' in content_type:
+            return '.mov'
+        return '.mp4'  # 默认mp4
+    return '.bin'  # 默认二进制
 
 def download_file(url: str) -> Optional[str]:
     """
-    下载文件到本地临时目录
+    下载文件到本地缓存目录
+    
+    同一URL只下载一次，之后的请求直接返回缓存的本地文件
     
     Args:
         url: 文件URL
@@ -68,41 +426,43 @@ def download_file(url: str) -> Optional[str]:
         下载后的本地文件路径，如果下载失败则返回None
     """
     try:
+        cache_key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        cached_path = _lookup_download_cache(cache_key)
+        if cached_path:
+            logger.info(f"使用已缓存的文件: {url} -> {cached_path}")
+            return cached_path
+        
         logger.info(f"开始下载文件: {url}")
-        # 生成唯一文件名
-        filename = str(uuid.uuid4())
-        file_extension = os.path.splitext(url)[1]
-        if not file_extension:
-            # 如果URL没有文件扩展名，尝试从内容类型判断
-            response = requests.head(url)
-            content_type = response.headers.get('Content-Type', '')
+        # 下载文件，响应头到达后即可确定文件类型，无需额外的HEAD请求。
+        # 下载出错时由with语句关闭响应，连接不会一直被占用
+        with http_session.get(url, stream=True) as response:
+            response.raise_for_status()
             
-            if 'image' in content_type:
-                if 'jpeg' in content_type or 'jpg' in content_type:
-                    file_extension = '.jpg'
-                elif 'png' in content_type:
-                    file_extension = '.png'
-                else:
-                    file_extension = '.jpg'  # 默认jpg
-            elif 'audio' in content_type:
-                if 'mp3' in content_type:
-                    file_extension = '.mp3'
-                elif 'wav' in content_type:
-                    file_extension = '.wav'
+            file_extension = os.path.splitext(urlparse(url).path)[1].lower()
+            if file_extension not in DOWNLOAD_EXTENSIONS:
+                # 如果URL没有可识别的文件扩展名，尝试从内容类型判断
+                file_extension = _guess_extension(response.headers.get('Content-Type', ''))
+            
+            local_path = DOWNLOAD_CACHE_FOLDER / f"{cache_key}{file_extension}"
+            # 先写入临时文件，完成后再原子替换，避免其他请求读到不完整的文件
+            tmp_path = DOWNLOAD_CACHE_FOLDER / f"{cache_key}.{uuid.uuid4().hex}.part"
+            
+            etag = response.headers.get('ETag')
+            total_size = int(response.headers.get('Content-Length') or 0)
+            accepts_ranges = response.headers.get('Accept-Ranges', '').lower() == 'bytes'
+            try:
+                if accepts_ranges and total_size >= RANGED_DOWNLOAD_THRESHOLD and hasattr(os, 'pwrite'):
+                    # 大文件改为分段并行下载，关闭当前的整体下载响应
+                    response.close()
+                    _download_ranges(url, tmp_path, total_size)
                 else:
-                    file_extension = '.mp3'  # 默认mp3
-            else:
-                file_extension = '.bin'  # 默认二进制
-        
-        local_path = UPLOAD_FOLDER / f"{filename}{file_extension}"
-        
-        # 下载文件
-        response = requests.get(url, stream=True)
-        response.raise_for_status()
+                    _download_stream(response, tmp_path, total_size)
+                os.replace(tmp_path, local_path)
+            finally:
+                if tmp_path.exists():
+                    tmp_path.unlink()
         
-        with open(local_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
+        _store_download_cache(cache_key, url, local_path, etag)
         
         logger.info(f"文件下载成功: {local_path}")
         return str(local_path)
@@ -110,39 +470,274 @@ def download_file(url: str) -> Optional[str]:
         logger.error(f"下载文件失败: {str(e)}")
         return None
 
-def decode_base64_image(base64_string: str) -> Optional[str]:
+def download_files(urls: List[str]) -> List[Optional[str]]:
     """
-    解码Base64字符串为图片文件
+    并发下载多个文件到本地临时目录
+    
+    下载是网络I/O密集型任务，使用线程池让所有URL同时传输，
+    总耗时约等于最慢的单个下载，而不是所有下载耗时之和
     
     Args:
-        base64_string: Base64编码的图片数据
+        urls: 文件URL列表
         
     Returns:
-        保存后的图片文件路径，如果解码失败则返回None
+        与urls一一对应的本地文件路径列表，下载失败的项为None
     """
-    try:
-        logger.info("开始解码Base64图片")
-        # 移除可能的前缀
-        if ',' in base64_string:
-            base64_string = base64_string.split(',', 1)[1]
-        
-        # 解码Base64数据
-        image_data = base64.b64decode(base64_string)
+    if not urls:
+        return []
+    
+    max_workers = min(MAX_DOWNLOAD_WORKERS, len(urls))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(download_file, urls))
+
+def save_image_data(image_data: bytes) -> Optional[str]:
+    """
+    将图片二进制数据保存为图片文件
+    
+    Args:
+        image_data: 图片的二进制数据
         
+    Returns:
+        保存后的图片文件路径，如果保存失败则返回None
+    """
+    try:
         # 生成唯一文件名
         filename = str(uuid.uuid4()) + '.jpg'  # 默认使用jpg格式
         local_path = UPLOAD_FOLDER / filename
         
-        # 保存文件
-        with open(local_path, 'wb') as f:
-            f.write(image_data)
+        # 直接写入文件描述符，不经过额外的缓冲区
+        fd = os.open(local_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            view = memoryview(image_data)
+            while view:
+                written = os.write(fd, view)
+                view = view[written:]
+        finally:
+            os.close(fd)
+        
+        return str(local_path)
+    except Exception as e:
+        logger.error(f"保存图片失败: {str(e)}")
+        return None
+
+def save_uploaded_image(file) -> Optional[str]:
+    """
+    保存通过multipart/form-data上传的图片文件
+    
+    Args:
+        file: 上传的文件对象（werkzeug的FileStorage）
+        
+    Returns:
+        保存后的图片文件路径，如果保存失败则返回None
+    """
+    try:
+        # 保留上传文件的扩展名，没有时默认使用jpg格式
+        file_extension = os.path.splitext(file.filename or '')[1] or '.jpg'
+        local_path = UPLOAD_FOLDER / f"{uuid.uuid4()}{file_extension}"
         
-        logger.info(f"Base64图片解码成功: {local_path}")
+        # 上传内容已经由werkzeug以流的方式接收，直接保存到目标路径
+        file.save(str(local_path))
+        
+        logger.info(f"上传图片保存成功: {local_path}")
         return str(local_path)
+    except Exception as e:
+        logger.error(f"保存上传图片失败: {str(e)}")
+        return None
+
+def decode_base64_image(base64_string: Union[str, bytes]) -> Optional[str]:
+    """
+    解码Base64字符串为图片文件
+    
+    Args:
+        base64_string: Base64编码的图片数据，可以带有data URL前缀
+        
+    Returns:
+        保存后的图片文件路径，如果解码失败则返回None
+    """
+    try:
+        logger.info("开始解码Base64图片")
+        data = base64_string.encode('ascii') if isinstance(base64_string, str) else base64_string
+        
+        # 移除可能的前缀（如"data:image/jpeg;base64,"），只需在开头查找逗号，
+        # 通过memoryview切片避免复制整段数据
+        prefix_end = data.find(b',', 0, 256)
+        payload = memoryview(data)[prefix_end + 1:]
+        
+        # 解码Base64数据
+        image_data = binascii.a2b_base64(payload)
+        
+        local_path = save_image_data(image_data)
+        if local_path:
+            logger.info(f"Base64图片解码成功: {local_path}")
+        return local_path
     except Exception as e:
         logger.error(f"解码Base64图片失败: {str(e)}")
         return None
 
+def _parse_float(value: Any, name: str) -> float:
+    """
+    将请求参数转换为浮点数
+    
+    Args:
+        value: 参数值
+        name: 参数名，用于错误信息
+        
+    Returns:
+        转换后的浮点数
+    """
+    try:
+        result = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"参数{name}必须是数字")
+    if not math.isfinite(result):
+        raise ValueError(f"参数{name}必须是有限的数字")
+    return result
+
+def _parse_str(params: Mapping, name: str, default: Optional[str] = None) -> Optional[str]:
+    """
+    读取字符串类型的请求参数
+    
+    Args:
+        params: 请求参数
+        name: 参数名
+        default: 参数未指定或为空时的默认值
+        
+    Returns:
+        参数值
+    """
+    value = params.get(name)
+    if value is None or value == '':
+        return default
+    if not isinstance(value, str):
+        raise ValueError(f"参数{name}必须是字符串")
+    return value
+
+def _parse_output_quality(params: Mapping) -> str:
+    """
+    读取并校验输出质量参数
+    
+    Args:
+        params: 请求参数
+        
+    Returns:
+        输出质量
+    """
+    output_quality = _parse_str(params, 'output_quality', 'medium')
+    if output_quality not in OUTPUT_QUALITIES:
+        raise ValueError(f"参数output_quality必须是{', '.join(OUTPUT_QUALITIES)}之一")
+    return output_quality
+
+def _parse_resolution(value: Any) -> Optional[Tuple[int, int]]:
+    """
+    解析"宽x高"格式的分辨率参数
+    
+    Args:
+        value: 参数值，如"1920x1080"
+        
+    Returns:
+        (宽, 高)，未指定时返回None
+    """
+    if not value:
+        return None
+    try:
+        width, height = map(int, str(value).lower().split('x'))
+    except ValueError:
+        raise ValueError("参数output_resolution格式错误，应为\"宽x高\"")
+    if width <= 0 or height <= 0:
+        raise ValueError("参数output_resolution必须为正数")
+    return width, height
+
+@dataclass
+class Image2VideoRequest:
+    """图片转视频接口的请求参数"""
+    image_url: Optional[str] = None
+    image_base64: Optional[str] = None
+    audio_url: Optional[str] = None
+    animation_type: str = '放大'
+    animation_curve: str = '线性'
+    duration: float = 5.0
+    output_quality: str = 'medium'
+    
+    @classmethod
+    def from_params(cls, params: Optional[Mapping]) -> 'Image2VideoRequest':
+        """
+        从请求参数构建并校验，参数不合法时抛出ValueError
+        
+        Args:
+            params: JSON请求体、表单或查询字符串参数
+            
+        Returns:
+            请求参数对象
+        """
+        if not isinstance(params, Mapping):
+            raise ValueError("请求体不是有效的JSON对象")
+        
+        duration = _parse_float(params.get('duration', 5.0), 'duration')
+        if not 0 < duration <= MAX_CLIP_DURATION:
+            raise ValueError(f"参数duration必须大于0且不超过{MAX_CLIP_DURATION:g}")
+        
+        return cls(
+            image_url=_parse_str(params, 'image_url'),
+            image_base64=_parse_str(params, 'image_base64'),
+            audio_url=_parse_str(params, 'audio_url'),
+            animation_type=_parse_str(params, 'animation_type', '放大'),
+            animation_curve=_parse_str(params, 'animation_curve', '线性'),
+            duration=duration,
+            output_quality=_parse_output_quality(params)
+        )
+
+@dataclass
+class MergeVideosRequest:
+    """视频合成接口的请求参数"""
+    video_urls: List[str]
+    transition_type: str = '淡入淡出'
+    transition_duration: float = 0.7
+    output_quality: str = 'medium'
+    output_resolution: Optional[Tuple[int, int]] = None
+    
+    @classmethod
+    def from_params(cls, params: Optional[Mapping]) -> 'MergeVideosRequest':
+        """
+        从请求参数构建并校验，参数不合法时抛出ValueError
+        
+        Args:
+            params: JSON请求体
+            
+        Returns:
+            请求参数对象
+        """
+        if not isinstance(params, Mapping):
+            raise ValueError("请求体不是有效的JSON对象")
+        
+        video_urls = params.get('video_urls')
+        if not video_urls:
+            raise ValueError("缺少视频URL列表参数")
+        if not isinstance(video_urls, list) or not all(isinstance(url, str) and url for url in video_urls):
+            raise ValueError("参数video_urls必须是URL字符串列表")
+        
+        transition_duration = _parse_float(params.get('transition_duration', 0.7), 'transition_duration')
+        if not 0 <= transition_duration <= MAX_TRANSITION_DURATION:
+            raise ValueError(f"参数transition_duration必须在0到{MAX_TRANSITION_DURATION:g}之间")
+        
+        return cls(
+            video_urls=video_urls,
+            transition_type=_parse_str(params, 'transition_type', '淡入淡出'),
+            transition_duration=transition_duration,
+            output_quality=_parse_output_quality(params),
+            output_resolution=_parse_resolution(params.get('output_resolution'))
+        )
+
+@app.errorhandler(413)
+def request_too_large(e):
+    """
+    请求体超过MAX_REQUEST_SIZE时返回JSON格式的错误
+    """
+    logger.error("请求体过大")
+    return jsonify({
+        'status': 'error',
+        'error': f'请求体过大，最大允许{MAX_REQUEST_SIZE // (1024 * 1024)}MB'
+    }), 413
+
 @app.route('/api/image2video', methods=['POST'])
 def image_to_video():
     """
@@ -150,6 +745,8 @@ def image_to_video():
     
     接收参数:
     - image_url 或 image_base64: 图片URL或Base64编码
+      也可以通过 multipart/form-data 的 image 字段上传图片文件，此时其他参数作为表单字段传递；
+      或直接以 application/octet-stream 请求体上传图片，此时其他参数通过查询字符串传递
     - audio_url: 音频URL(可选)
     - animation_type: 动画类型(默认为"放大")
     - animation_curve: 动画曲线(默认为"线性")
@@ -163,15 +760,35 @@ def image_to_video():
     """
     try:
         logger.info("收到图片转视频请求")
-        # 获取请求参数
-        json_data = request.get_json()
+        raw_upload = request.mimetype == 'application/octet-stream'
+        form_upload = request.mimetype == 'multipart/form-data'
+        
+        # 获取并校验请求参数，JSON请求体只解析一次
+        try:
+            if raw_upload:
+                # 二进制上传时其他参数通过查询字符串传递
+                params = Image2VideoRequest.from_params(request.args)
+            elif form_upload:
+                params = Image2VideoRequest.from_params(request.form)
+            else:
+                params = Image2VideoRequest.from_params(request.get_json(silent=True))
+        except ValueError as e:
+            logger.error(f"请求参数错误: {str(e)}")
+            return jsonify({
+                'status': 'error',
+                'error': str(e)
+            }), 400
         
         # 检查是否有图片数据
         image_path = None
-        if 'image_url' in json_data:
-            image_path = download_file(json_data['image_url'])
-        elif 'image_base64' in json_data:
-            image_path = decode_base64_image(json_data['image_base64'])
+        if raw_upload:
+            image_path = save_image_data(request.get_data(cache=False))
+        elif form_upload and 'image' in request.files:
+            image_path = save_uploaded_image(request.files['image'])
+        elif params.image_url:
+            image_path = download_file(params.image_url)
+        elif params.image_base64:
+            image_path = decode_base64_image(params.image_base64)
         else:
             logger.error("缺少图片参数")
             return jsonify({
@@ -188,8 +805,8 @@ def image_to_video():
         
         # 获取音频(如果有)
         audio_path = None
-        if 'audio_url' in json_data and json_data['audio_url']:
-            audio_path = download_file(json_data['audio_url'])
+        if params.audio_url:
+            audio_path = download_file(params.audio_url)
             if not audio_path:
                 logger.error("音频下载失败")
                 return jsonify({
@@ -198,10 +815,10 @@ def image_to_video():
                 }), 400
         
         # 获取其他参数
-        animation_type = json_data.get('animation_type', '放大')
-        animation_curve = json_data.get('animation_curve', '线性')
-        duration = float(json_data.get('duration', 5.0))
-        output_quality = json_data.get('output_quality', 'medium')
+        animation_type = params.animation_type
+        animation_curve = params.animation_curve
+        duration = params.duration
+        output_quality = params.output_quality
         
         logger.info(f"处理参数: 动画={animation_type}, 曲线={animation_curve}, 时长={duration}秒")
         
@@ -222,8 +839,10 @@ def image_to_video():
         
         logger.info(f"开始生成视频: {output_path}")
         
-        # 调用视频服务生成视频
-        video_path = video_service.preview_clip(item, str(output_path))
+        # 在编码进程池中生成视频，限制同时运行的编码任务数
+        # 接口直接返回最终视频，使用高质量的动画插值
+        future = get_encode_pool().submit(render_preview_clip, item, str(output_path), "high")
+        video_path = future.result(timeout=ENCODE_TIMEOUT)
         
         # 构建视频URL
         server_url = request.host_url.rstrip('/')
@@ -236,6 +855,9 @@ def image_to_video():
             'video_url': video_url
         })
         
+    except HTTPException:
+        # 交给Flask的错误处理，如请求体过大时返回413
+        raise
     except Exception as e:
         logger.error(f"处理请求时发生错误: {str(e)}")
         traceback.print_exc()
@@ -263,37 +885,33 @@ def merge_videos():
     """
     try:
         logger.info("收到视频合成请求")
-        # 获取请求参数
-        json_data = request.get_json()
-        
-        # 检查是否有视频URL列表
-        if 'video_urls' not in json_data or not json_data['video_urls']:
-            logger.error("缺少视频URL列表参数")
+        # 获取并校验请求参数，JSON请求体只解析一次
+        try:
+            params = MergeVideosRequest.from_params(request.get_json(silent=True))
+        except ValueError as e:
+            logger.error(f"请求参数错误: {str(e)}")
             return jsonify({
                 'status': 'error',
-                'error': '缺少视频URL列表参数'
+                'error': str(e)
             }), 400
         
-        video_urls = json_data['video_urls']
+        video_urls = params.video_urls
         logger.info(f"合成视频数量: {len(video_urls)}")
         
-        # 下载所有视频到本地
-        video_paths = []
-        for url in video_urls:
-            path = download_file(url)
+        # 并发下载所有视频到本地
+        video_paths = download_files(video_urls)
+        for url, path in zip(video_urls, video_paths):
             if not path:
                 logger.error(f"下载视频失败: {url}")
                 return jsonify({
                     'status': 'error',
                     'error': f'下载视频失败: {url}'
                 }), 400
-            video_paths.append(path)
         
         # 获取其他参数
-        transition_type = json_data.get('transition_type', '淡入淡出')
-        transition_duration = float(json_data.get('transition_duration', 0.7))
-        output_quality = json_data.get('output_quality', 'medium')
-        output_resolution = json_data.get('output_resolution', None)
+        transition_type = params.transition_type
+        transition_duration = params.transition_duration
+        output_quality = params.output_quality
         
         logger.info(f"处理参数: 转场={transition_type}, 转场时长={transition_duration}秒")
         
@@ -301,33 +919,6 @@ def merge_videos():
         output_filename = f"{uuid.uuid4()}.mp4"
         output_path = OUTPUT_FOLDER / output_filename
         
-        # 导入MoviePy库来处理视频合并
-        from moviepy.editor import VideoFileClip, concatenate_videoclips
-        
-        # 加载所有视频片段
-        video_clips = [VideoFileClip(path) for path in video_paths]
-        
-        # 如果指定了分辨率，调整所有片段的尺寸
-        if output_resolution:
-            width, height = map(int, output_resolution.split('x'))
-            video_clips = [clip.resize((width, height)) for clip in video_clips]
-            logger.info(f"设置输出分辨率: {width}x{height}")
-        
-        # 应用转场效果并合并视频
-        if len(video_clips) > 1:
-            # 调用视频服务的转场功能
-            processed_clips = video_service.transition_service.apply_transitions_to_clips(
-                video_clips, 
-                transition_type, 
-                transition_duration
-            )
-            
-            # 合并处理后的片段
-            final_clip = concatenate_videoclips(processed_clips, method="compose")
-        else:
-            # 只有一个片段，无需转场
-            final_clip = video_clips[0]
-        
         # 设置输出质量
         bitrate = '2500k'  # 默认中等质量
         if output_quality == 'low':
@@ -335,17 +926,92 @@ def merge_videos():
         elif output_quality == 'high':
             bitrate = '5000k'
         
-        logger.info(f"开始写入视频文件: {output_path}, 质量={output_quality}")
+        resolution = params.output_resolution
+        if resolution:
+            logger.info(f"设置输出分辨率: {resolution[0]}x{resolution[1]}")
         
-        # 写入文件
-        final_clip.write_videofile(
-            str(output_path),
-            codec='libx264',
-            audio_codec='aac',
-            bitrate=bitrate,
-            fps=30,
-            threads=4
-        )
+        # 先确定每个连接点的转场效果，随机转场在这里解析为具体效果；
+        # 转场时长不大于0时不会产生任何转场画面，等同于无转场
+        transition_service = video_service.transition_service
+        transition_names = [
+            transition_service.resolve_transition_name(transition_type) if transition_duration > 0 else "无"
+            for _ in range(len(video_paths) - 1)
+        ]
+        
+        ffmpeg_service = video_service.ffmpeg_service
+        merged = False
+        
+        # 没有转场且所有视频的编码参数一致时，直接按流复制拼接，不重新编码
+        if all(name == "无" for name in transition_names) and ffmpeg_service.can_concat_copy(video_paths, resolution):
+            try:
+                logger.info(f"使用流复制拼接视频: {output_path}")
+                ffmpeg_service.concat_copy(video_paths, str(output_path))
+                merged = True
+            except Exception as e:
+                logger.warning(f"流复制拼接失败，改为重新编码: {str(e)}")
+        
+        # 转场效果都能由ffmpeg滤镜实现时，直接由ffmpeg完成合并，帧数据不经过Python
+        if not merged and ffmpeg_service.supports_transitions(transition_names):
+            try:
+                logger.info(f"使用ffmpeg合并视频: {output_path}, 质量={output_quality}")
+                ffmpeg_service.merge_videos(
+                    video_paths,
+                    str(output_path),
+                    transition_names,
+                    transition_duration,
+                    bitrate,
+                    resolution=resolution
+                )
+                merged = True
+            except Exception as e:
+                logger.warning(f"ffmpeg合并失败，改用MoviePy: {str(e)}")
+        
+        if not merged:
+            # 导入MoviePy库来处理视频合并
+            from moviepy.editor import VideoFileClip, concatenate_videoclips
+            
+            # 并行加载所有视频片段：每个VideoFileClip都会启动ffmpeg子进程探测文件信息
+            with ThreadPoolExecutor(max_workers=min(8, len(video_paths))) as executor:
+                video_clips = list(executor.map(VideoFileClip, video_paths))
+                
+                # 如果指定了分辨率，调整所有片段的尺寸
+                if resolution:
+                    video_clips = list(executor.map(lambda clip: clip.resize(resolution), video_clips))
+            
+            # 应用转场效果并合并视频
+            if len(video_clips) > 1:
+                # 调用视频服务的转场功能，使用上面已经确定的转场效果
+                processed_clips = transition_service.apply_transitions_to_clips(
+                    video_clips, 
+                    transition_type, 
+                    transition_duration,
+                    use_custom_transitions=True,
+                    custom_transitions=transition_names
+                )
+                
+                # 合并处理后的片段
+                final_clip = concatenate_videoclips(processed_clips, method="compose")
+            else:
+                # 只有一个片段，无需转场
+                final_clip = video_clips[0]
+            
+            # 有硬件编码器时使用硬件编码，否则使用libx264
+            codec = ffmpeg_service.get_h264_encoder()
+            preset, encoder_params = ffmpeg_service.get_encoder_settings(codec)
+            
+            logger.info(f"开始写入视频文件: {output_path}, 质量={output_quality}, 编码器={codec}")
+            
+            # 写入文件
+            final_clip.write_videofile(
+                str(output_path),
+                codec=codec,
+                audio_codec='aac',
+                bitrate=bitrate,
+                fps=30,
+                threads=4,
+                preset=preset,
+                ffmpeg_params=encoder_params or None
+            )
         
         # 构建视频URL
         server_url = request.host_url.rstrip('/')
@@ -358,6 +1024,9 @@ def merge_videos():
             'video_url': video_url
         })
         
+    except HTTPException:
+        # 交给Flask的错误处理，如请求体过大时返回413
+        raise
     except Exception as e:
         logger.error(f"处理请求时发生错误: {str(e)}")
         traceback.print_exc()
@@ -381,7 +1050,27 @@ def get_video(filename):
             }), 404
         
         logger.info(f"提供视频下载: {filename}")
-        return send_file(str(video_path), mimetype='video/mp4')
+        # 完整下载时视频会被顺序读取，预先触发预读，冷缓存时减少磁盘等待。
+        # Range请求只读取一部分，条件请求可能直接返回304，都不预读整个文件
+        if not any(header in request.headers for header in ('Range', 'If-None-Match', 'If-Modified-Since')):
+            _prefetch_file(video_path)
+        
+        if VIDEO_ACCEL_REDIRECT_PREFIX:
+            # 由Nginx负责实际的文件传输（支持Range请求），Python不读取文件内容
+            prefix = VIDEO_ACCEL_REDIRECT_PREFIX.rstrip('/')
+            return Response('', headers={
+                'X-Accel-Redirect': f"{prefix}/{filename}",
+                'Content-Type': 'video/mp4'
+            })
+        
+        # 支持条件请求和Range请求，便于播放器拖动进度
+        return send_file(
+            str(video_path),
+            mimetype='video/mp4',
+            conditional=True,
+            etag=True,
+            last_modified=video_path.stat().st_mtime
+        )
     except Exception as e:
         logger.error(f"提供视频下载时发生错误: {str(e)}")
         return jsonify({
@@ -408,4 +1097,4 @@ if __name__ == '__main__':
     args = parser.parse_args()
     
     logger.info(f"使用端口 {args.port}")
-    app.run(host="0.0.0.0", port=args.port, debug=False)
\ No newline at end of file
+    app.run(host="0.0.0.0", port=args.port, debug=False, threaded=True)
\ No newline at end of file
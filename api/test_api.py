@@ -6,14 +6,16 @@
 
 import requests
 import json
-import base64
 import os
+import shutil
 import time
 import argparse
 from pathlib import Path
 
 # 默认API地址
 DEFAULT_API_URL = "http://localhost:5000"
+# 下载视频时每次读取的数据块大小（1 MiB）
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
 
 def test_health_check(api_url):
     """测试健康检查接口"""
@@ -34,22 +36,22 @@ def test_image_to_video(api_url, image_path, animation_type="放大", animation_
     """测试图片转视频接口"""
     print(f"测试图片转视频接口，使用图片: {image_path}...")
     
-    # 读取图片并编码为base64
-    with open(image_path, "rb") as image_file:
-        image_base64 = base64.b64encode(image_file.read()).decode('utf-8')
-    
     # 构建请求数据
     data = {
-        "image_base64": image_base64,
         "animation_type": animation_type,
         "animation_curve": animation_curve,
         "duration": duration
     }
     
-    # 发送请求
+    # 发送请求，图片以multipart/form-data文件上传，无需base64编码
     try:
         print("发送请求中...")
-        response = requests.post(f"{api_url}/api/image2video", json=data)
+        with open(image_path, "rb") as image_file:
+            response = requests.post(
+                f"{api_url}/api/image2video",
+                files={"image": (os.path.basename(image_path), image_file)},
+                data=data
+            )
         
         if response.status_code == 200:
             result = response.json()
@@ -70,9 +72,9 @@ def download_video(video_url, output_path):
     try:
         response = requests.get(video_url, stream=True)
         if response.status_code == 200:
+            response.raw.decode_content = True
             with open(output_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
+                shutil.copyfileobj(response.raw, f, length=DOWNLOAD_CHUNK_SIZE)
             print(f"视频下载成功: {output_path}")
             file_size = os.path.getsize(output_path) / 1024
             print(f"文件大小: {file_size:.2f} KB")
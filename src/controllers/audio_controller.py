@@ -1,6 +1,8 @@
 from typing import List, Dict, Optional
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 import os
+import threading
 
 from ..services.audio_service import AudioService
 from ..models.image_item import ImageItem
@@ -8,6 +10,11 @@ from ..models.image_item import ImageItem
 class AudioController:
     """音频控制器，处理音频生成相关的业务逻辑"""
     
+    # 批量生成音频时的最大线程数
+    MAX_AUDIO_WORKERS = 8
+    # 同时向语音合成服务发起的最大请求数，避免触发服务端限流
+    MAX_CONCURRENT_TTS = 4
+    
     def __init__(self, audio_service: AudioService):
         """
         初始化音频控制器
@@ -16,6 +23,7 @@ class AudioController:
             audio_service: 音频服务实例
         """
         self.audio_service = audio_service
+        self._tts_semaphore = threading.Semaphore(self.MAX_CONCURRENT_TTS)
     
     def generate_audio_for_item(self, item: ImageItem) -> bool:
         """
@@ -31,16 +39,13 @@ class AudioController:
             return False
         
         try:
-            # 获取图片文件名（不含扩展名）
-            image_path = str(item.image_path) if isinstance(item.image_path, Path) else item.image_path
-            image_name = os.path.basename(image_path)
-            
             # 生成音频文件
-            audio_path = self.audio_service.generate_speech(
-                item.text,
-                f"{item.id}.mp3",  # 默认文件名使用ID
-                image_name         # 优先使用图片名称
-            )
+            with self._tts_semaphore:
+                audio_path = self.audio_service.generate_speech(
+                    item.text,
+                    f"{item.id}.mp3",  # 默认文件名使用ID
+                    item.image_name    # 优先使用图片名称
+                )
             
             if audio_path:
                 item.audio_path = audio_path
@@ -62,13 +67,7 @@ class AudioController:
         Returns:
             字典，键为项目ID，值为是否成功生成音频
         """
-        results = {}
-        
-        for item in items:
-            success = self.generate_audio_for_item(item)
-            results[item.id] = success
-            
-        return results
+        return self._generate_audio_parallel(items)
     
     def check_and_generate_missing_audio(self, items: List[ImageItem]) -> Dict[str, bool]:
         """
@@ -80,15 +79,34 @@ class AudioController:
         Returns:
             字典，键为项目ID，值为是否成功生成音频
         """
-        results = {}
+        # 检查是否有文本但没有音频或音频不存在
+        missing_items = [
+            item for item in items
+            if item.text.strip() and (not item.audio_path or not item.audio_path.exists())
+        ]
+        
+        return self._generate_audio_parallel(missing_items)
+    
+    def _generate_audio_parallel(self, items: List[ImageItem]) -> Dict[str, bool]:
+        """
+        使用线程池并行为多个项目生成音频
+        
+        语音合成主要是网络请求，并行后总耗时接近最慢的单个请求
+        
+        Args:
+            items: 图片项目列表
+            
+        Returns:
+            字典，键为项目ID，值为是否成功生成音频（顺序与items一致）
+        """
+        if not items:
+            return {}
         
-        for item in items:
-            # 检查是否有文本但没有音频或音频不存在
-            if item.text.strip() and (not item.audio_path or not item.audio_path.exists()):
-                success = self.generate_audio_for_item(item)
-                results[item.id] = success
+        max_workers = min(self.MAX_AUDIO_WORKERS, len(items))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            successes = list(executor.map(self.generate_audio_for_item, items))
         
-        return results
+        return {item.id: success for item, success in zip(items, successes)}
     
     def preview_audio(self, item: ImageItem) -> bool:
         """
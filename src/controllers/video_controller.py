@@ -1,12 +1,16 @@
 from typing import List, Dict, Optional, Union, Tuple
-from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing
 import os
 
-from ..services.video_service import VideoService
+from ..services.video_service import VideoService, render_preview_clip, init_render_worker
 from ..services.audio_service import AudioService
 from ..controllers.audio_controller import AudioController
 from ..models.image_item import ImageItem
 
+# 同时生成片段的最大进程数，留一个核心给界面和音频
+MAX_CLIP_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+
 class VideoController:
     """视频控制器，处理视频生成相关的业务逻辑"""
     
@@ -26,6 +30,14 @@ class VideoController:
         self.last_video_path = None
         # 存储已生成的片段，格式：{图片路径: 视频片段路径}
         self.generated_clips = {}
+        # 生成过程中使用的片段目录索引，格式：{片段文件名: (片段路径, 修改时间)}；
+        # 为None时直接检查文件系统
+        self._clip_index = None
+        # 设置已更改、需要重新生成片段的图片路径；
+        # 即使磁盘上又出现了同名片段文件，也不会被当作已生成
+        self._stale_clips = set()
+        # 片段目录的字符串形式，拼接片段路径时直接使用
+        self._video_dir = str(self.video_service.path_service.video_directory)
     
     def _get_clip_filename(self, item: ImageItem) -> str:
         """
@@ -37,8 +49,7 @@ class VideoController:
         Returns:
             生成的文件名
         """
-        image_filename = os.path.splitext(os.path.basename(str(item.image_path)))[0]
-        return f"{image_filename}_clip.mp4"
+        return item.clip_filename
     
     def _get_clip_filepath(self, item: ImageItem) -> str:
         """
@@ -50,13 +61,47 @@ class VideoController:
         Returns:
             片段文件的完整路径
         """
-        filename = self._get_clip_filename(item)
-        return str(self.video_service.path_service.video_directory / filename)
+        return os.path.join(self._video_dir, item.clip_filename)
+    
+    def _refresh_clip_index(self) -> None:
+        """
+        扫描一次视频目录，建立片段文件的索引
+        
+        生成过程中检查片段时只需查询索引，不必对每个片段单独访问文件系统
+        """
+        video_dir = self.video_service.path_service.video_directory
+        try:
+            with os.scandir(video_dir) as entries:
+                self._clip_index = {
+                    entry.name: (entry.path, entry.stat().st_mtime)
+                    for entry in entries
+                    if entry.name.endswith("_clip.mp4") and entry.is_file()
+                }
+        except FileNotFoundError:
+            self._clip_index = {}
+    
+    def _is_clip_up_to_date(self, item: ImageItem, clip_mtime: float) -> bool:
+        """
+        检查片段是否在源图片最后一次修改之后生成
+        
+        Args:
+            item: 图片项目
+            clip_mtime: 片段文件的修改时间
+            
+        Returns:
+            片段未过期则返回True
+        """
+        try:
+            return os.stat(item.image_path).st_mtime <= clip_mtime
+        except OSError:
+            return True
     
     def is_clip_generated(self, item: ImageItem) -> bool:
         """
         检查片段是否已经生成
         
+        源图片在片段生成之后被修改过时，片段视为未生成
+        
         Args:
             item: 图片项目
             
@@ -64,21 +109,33 @@ class VideoController:
             如果片段已生成则返回True，否则返回False
         """
         # 获取图片路径的字符串表示
-        image_path_str = str(item.image_path)
+        image_path_str = item.image_key
+        
+        if image_path_str in self._stale_clips:
+            return False
         
-        # 检查缓存中是否有该片段
-        if image_path_str in self.generated_clips:
-            clip_path = self.generated_clips[image_path_str]
-            if os.path.exists(clip_path):
-                return True
+        # 生成过程中直接查询片段目录索引
+        if self._clip_index is not None:
+            entry = self._clip_index.get(self._get_clip_filename(item))
+            if entry is None or not self._is_clip_up_to_date(item, entry[1]):
+                return False
+            self.generated_clips[image_path_str] = entry[0]
+            return True
         
-        # 检查文件系统中是否存在该片段
-        clip_path = self._get_clip_filepath(item)
-        if os.path.exists(clip_path):
+        # 依次检查缓存中的片段路径和默认的片段路径
+        for clip_path in (self.generated_clips.get(image_path_str), self._get_clip_filepath(item)):
+            if not clip_path:
+                continue
+            try:
+                clip_mtime = os.stat(clip_path).st_mtime
+            except OSError:
+                continue
+            if not self._is_clip_up_to_date(item, clip_mtime):
+                return False
             # 存在则更新缓存并返回True
             self.generated_clips[image_path_str] = clip_path
             return True
-            
+        
         return False
     
     def generate_clip(self, item: ImageItem) -> str:
@@ -93,7 +150,7 @@ class VideoController:
         """
         try:
             # 获取图片路径的字符串表示
-            image_path_str = str(item.image_path)
+            image_path_str = item.image_key
             
             # 检查是否已生成该片段
             if self.is_clip_generated(item):
@@ -108,10 +165,11 @@ class VideoController:
             output_filename = self._get_clip_filename(item)
             
             # 生成视频片段
-            output_path = self.video_service.preview_clip(item.to_dict(), output_filename)
+            output_path = self.video_service.preview_clip(item, output_filename)
             
             # 缓存生成的片段路径
             self.generated_clips[image_path_str] = output_path
+            self._stale_clips.discard(image_path_str)
             
             return output_path
             
@@ -136,7 +194,7 @@ class VideoController:
                 clip_path = self.generate_clip(item)
             else:
                 # 已生成则直接获取路径
-                clip_path = self.generated_clips[str(item.image_path)]
+                clip_path = self.generated_clips[item.image_key]
                 
             # 使用默认播放器预览
             return self.video_service.open_with_default_player(clip_path)
@@ -168,13 +226,12 @@ class VideoController:
             # 检查并生成缺失的片段
             self._ensure_clips_for_items(items)
             
-            # 创建输出目录
-            output_dir = Path("output")
-            output_dir.mkdir(exist_ok=True)
+            # 输出目录由PathService在初始化时创建
+            output_dir = self.video_service.path_service.output_directory
             
             # 生成视频
             output_path = self.video_service.create_video(
-                [item.to_dict() for item in items],
+                items,
                 str(output_dir / "final_video.mp4"),
                 settings["transition"],
                 settings["transition_duration"],
@@ -182,7 +239,8 @@ class VideoController:
                     "use_custom_transitions": settings.get("use_custom_transitions", False),
                     "custom_transitions": settings.get("custom_transitions", []),
                     "video_resolution": settings.get("video_resolution", None),
-                    "output_quality": settings.get("output_quality", "medium")
+                    "output_quality": settings.get("output_quality", "medium"),
+                    "resample": settings.get("resample")
                 }
             )
             
@@ -235,12 +293,51 @@ class VideoController:
         Args:
             items: 图片项目列表
         """
-        for i, item in enumerate(items):
-            if not self.is_clip_generated(item):
-                print(f"正在生成缺失的片段 {i+1}/{len(items)}...")
+        # 扫描一次视频目录，之后的检查只查询索引
+        self._refresh_clip_index()
+        try:
+            missing = []
+            for i, item in enumerate(items):
+                if not self.is_clip_generated(item):
+                    missing.append(item)
+                else:
+                    print(f"片段 {i+1}/{len(items)} 已存在，跳过生成")
+        finally:
+            self._clip_index = None
+        
+        if len(missing) <= 1 or MAX_CLIP_WORKERS == 1:
+            # 逐个生成时，在后台预读下一张图片，读取解码与当前片段的渲染编码同时进行
+            animation_service = self.video_service.animation_service
+            prefetch = None
+            for i, item in enumerate(missing):
+                if prefetch is not None:
+                    # 等待当前图片预读完成，避免与预读线程重复解码
+                    prefetch.result()
+                prefetch = animation_service.prefetch_image(missing[i + 1].image_path) if i + 1 < len(missing) else None
+                print(f"正在生成缺失的片段 {i+1}/{len(missing)}...")
                 self.generate_clip(item)
-            else:
-                print(f"片段 {i+1}/{len(items)} 已存在，跳过生成")
+            return
+        
+        # 各片段的图片和输出文件互不相关，缺失多个片段时在多个进程中同时生成；
+        # 音频仍在当前进程中准备好，工作进程只负责动画和编码
+        for item in missing:
+            if item.text.strip() and not item.has_audio:
+                self.audio_controller.generate_audio_for_item(item)
+        
+        workers = min(len(missing), MAX_CLIP_WORKERS)
+        print(f"正在使用 {workers} 个进程生成缺失的 {len(missing)} 个片段...")
+        # 使用spawn启动工作进程，避免fork带有界面线程的进程
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=init_render_worker, initargs=(workers,)) as executor:
+            futures = {
+                executor.submit(render_preview_clip, item, self._get_clip_filename(item)): item
+                for item in missing
+            }
+            for done, future in enumerate(as_completed(futures), 1):
+                item = futures[future]
+                self.generated_clips[item.image_key] = future.result()
+                self._stale_clips.discard(item.image_key)
+                print(f"片段已生成 {done}/{len(missing)}: {item.image_name}")
         
     def create_animation_for_item(self, item: ImageItem, scale_preset: str, position_preset: str, curve: str) -> None:
         """
@@ -260,6 +357,12 @@ class VideoController:
         # 应用到item
         item.animation = animation_settings
         
-        # 动画设置更改后，将相应的已生成片段标记为无效
-        if str(item.image_path) in self.generated_clips:
-            del self.generated_clips[str(item.image_path)] 
\ No newline at end of file
+        # 动画设置更改后，将相应的已生成片段标记为无效，并删除磁盘上的旧片段，
+        # 否则下次检查时会在文件系统中找到旧片段而不重新生成
+        self.generated_clips.pop(item.image_key, None)
+        self._stale_clips.add(item.image_key)
+        try:
+            os.unlink(self._get_clip_filepath(item))
+        except OSError:
+            # 文件不存在或正被播放器占用，仍由_stale_clips保证重新生成
+            pass 
\ No newline at end of file
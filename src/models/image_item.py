@@ -1,6 +1,8 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from functools import cached_property
 from typing import Optional, Dict
 from pathlib import Path
+import os
 
 @dataclass
 class ImageItem:
@@ -11,6 +13,17 @@ class ImageItem:
     duration: float = 5.0  # 默认显示时间
     animation: Optional[Dict] = None  # 动画设置
     order: int = 0
+    # 音频文件是否存在的缓存，重新设置audio_path时清除
+    _audio_exists: Optional[bool] = field(default=None, init=False, repr=False, compare=False)
+    
+    def __setattr__(self, name, value):
+        if name == 'audio_path':
+            object.__setattr__(self, '_audio_exists', None)
+        elif name == 'image_path':
+            # 清除由图片路径派生的缓存属性
+            for attr in ('image_key', 'image_name', 'image_stem', 'clip_filename'):
+                self.__dict__.pop(attr, None)
+        object.__setattr__(self, name, value)
     
     def __post_init__(self):
         if isinstance(self.image_path, str):
@@ -18,9 +31,47 @@ class ImageItem:
         if self.audio_path and isinstance(self.audio_path, str):
             self.audio_path = Path(self.audio_path)
     
+    @cached_property
+    def image_key(self) -> str:
+        """图片路径的字符串形式，用作片段缓存等字典的键"""
+        return str(self.image_path)
+    
+    @cached_property
+    def image_name(self) -> str:
+        """图片文件名（含扩展名）"""
+        return self.image_path.name
+    
+    @cached_property
+    def image_stem(self) -> str:
+        """图片文件名（不含扩展名）"""
+        return self.image_path.stem
+    
+    @cached_property
+    def clip_filename(self) -> str:
+        """该图片生成的视频片段文件名"""
+        return f"{self.image_stem}_clip.mp4"
+    
     @property
     def has_audio(self) -> bool:
-        return self.audio_path is not None and self.audio_path.exists()
+        """音频文件是否存在，检查结果会被缓存，直到audio_path被重新设置"""
+        if self._audio_exists is None:
+            self._audio_exists = self.audio_path is not None and os.path.exists(self.audio_path)
+        return self._audio_exists
+    
+    def get(self, key: str, default=None):
+        """
+        以字典的方式读取字段，服务层可以直接使用ImageItem，不必先转换为字典
+        
+        Args:
+            key: 字段名
+            default: 字段不存在时返回的默认值
+            
+        Returns:
+            字段值
+        """
+        if key.startswith('_') or key not in self.__dataclass_fields__:
+            return default
+        return getattr(self, key)
     
     def to_dict(self) -> dict:
         """转换为字典格式"""
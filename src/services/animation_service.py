@@ -1,10 +1,204 @@
 import cv2
+import functools
+import logging
 import numpy as np
 from pathlib import Path
 from typing import Dict, List, Tuple, Callable, Optional, Union, Any
+import os
 import random
+import threading
 import time
-from moviepy.editor import ImageClip, VideoClip
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from types import MappingProxyType
+
+logger = logging.getLogger(__name__)
+
+
+# 多项式形式的动画曲线，系数从最高次项到常数项排列，用np.polyval求值
+CURVE_POLYNOMIALS = {
+    "线性": np.array([1.0, 0.0]),  # 线性曲线：t
+    "缓入": np.array([1.0, 0.0, 0.0]),  # 缓入（慢开始，快结束）：t²
+    "缓出": np.array([-1.0, 2.0, 0.0]),  # 缓出（快开始，慢结束）：1 - (1 - t)²
+    "缓入缓出": np.array([-2.0, 3.0, 0.0, 0.0]),  # 缓入缓出：3t² - 2t³
+    "强缓入": np.array([1.0, 0.0, 0.0, 0.0]),  # 更强烈的缓入：t³
+    "强缓出": np.array([1.0, -3.0, 3.0, 0.0]),  # 更强烈的缓出：1 - (1 - t)³
+}
+
+# 动画曲线函数，同时支持标量和numpy数组输入
+CURVE_FUNCTIONS = MappingProxyType({
+    **{name: functools.partial(np.polyval, coeffs) for name, coeffs in CURVE_POLYNOMIALS.items()},
+    "平滑弹入": lambda t: 1 - np.cos(t * np.pi / 2),  # 平滑弹性进入
+    "平滑弹出": lambda t: np.sin(t * np.pi / 2),  # 平滑弹性退出
+    "随机": None  # 随机曲线标记，实际函数会在运行时确定
+})
+
+# "随机"曲线可以选择的具体曲线
+RANDOM_CURVE_NAMES = tuple(name for name, func in CURVE_FUNCTIONS.items() if func is not None)
+
+# 曲线查找表的分段数及各采样点的位置
+CURVE_LUT_SIZE = 4096
+CURVE_LUT_POINTS = np.linspace(0.0, 1.0, CURVE_LUT_SIZE + 1)
+
+
+def _has_cuda_device() -> bool:
+    """检查OpenCV是否编译了CUDA支持并且有可用的CUDA设备"""
+    try:
+        return cv2.cuda.getCudaEnabledDeviceCount() > 0
+    except (AttributeError, cv2.error):
+        return False
+
+
+def _build_curve_lut(curve_func: Callable) -> np.ndarray:
+    """
+    在[0, 1]区间上均匀采样曲线，生成只读的查找表
+
+    Args:
+        curve_func: 曲线函数
+
+    Returns:
+        长度为CURVE_LUT_SIZE + 1的曲线值数组
+    """
+    lut = np.array(curve_func(CURVE_LUT_POINTS), dtype=np.float64)
+    lut.flags.writeable = False
+    return lut
+
+
+# 各曲线的查找表，导入时一次性生成，所有实例共享
+CURVE_LUTS = MappingProxyType({name: _build_curve_lut(CURVE_FUNCTIONS[name]) for name in RANDOM_CURVE_NAMES})
+
+
+# 缩放预设选项
+SCALE_PRESETS = MappingProxyType({
+    "无": [1.0, 1.0],
+    "放大": [1.0, 1.2],
+    "缩小": [1.2, 1.0],
+    "轻微放大": [1.0, 1.1],
+    "轻微缩小": [1.1, 1.0],
+    "剧烈放大": [1.0, 1.25],
+    "脉动": [1.0, 1.05],
+    "随机": None  # 随机标记，实际值会在运行时确定
+})
+
+# 平移预设选项
+POSITION_PRESETS = MappingProxyType({
+    "无": [(0, 0), (0, 0)],
+    "左到右": [(-0.02, 0), (0.02, 0)],
+    "右到左": [(0.02, 0), (-0.02, 0)],
+    "上到下": [(0, -0.02), (0, 0.02)],
+    "下到上": [(0, 0.02), (0, -0.02)],
+    "左上到右下": [(-0.015, -0.015), (0.015, 0.015)],
+    "右上到左下": [(0.015, -0.015), (-0.015, 0.015)],
+    "左下到右上": [(-0.015, 0.015), (0.015, -0.015)],
+    "右下到左上": [(0.015, 0.015), (-0.015, -0.015)],
+    "轻微左右": [(-0.01, 0), (0.01, 0)],
+    "轻微上下": [(0, -0.01), (0, 0.01)],
+    "随机": None  # 随机标记，实际值会在运行时确定
+})
+
+# 预设动画效果（兼容原有代码）
+PRESET_ANIMATIONS = MappingProxyType({
+    # 静止画面不需要逐帧变换，生成片段时直接重复写入原始图片（见is_static_animation）
+    "静止": {
+        "scale": [1.0, 1.0],
+        "position": [(0, 0), (0, 0)],
+        "curve": "线性"
+    },
+    "缩放-放大": {
+        "scale": [1.0, 1.2],
+        "position": [(0, 0), (0, 0)],
+        "curve": "线性"
+    },
+    "缩放-缩小": {
+        "scale": [1.2, 1.0],
+        "position": [(0, 0), (0, 0)],
+        "curve": "线性"
+    },
+    "平移-左到右": {
+        "scale": [1.0, 1.0],
+        "position": [(-0.02, 0), (0.02, 0)],
+        "curve": "线性"
+    },
+    "平移-右到左": {
+        "scale": [1.0, 1.0],
+        "position": [(0.02, 0), (-0.02, 0)],
+        "curve": "线性"
+    },
+    "平移-上到下": {
+        "scale": [1.0, 1.0],
+        "position": [(0, -0.02), (0, 0.02)],
+        "curve": "线性"
+    },
+    "平移-下到上": {
+        "scale": [1.0, 1.0],
+        "position": [(0, 0.02), (0, -0.02)],
+        "curve": "线性"
+    },
+    "缩放+平移-左右": {
+        "scale": [1.0, 1.1],
+        "position": [(-0.02, 0), (0.02, 0)],
+        "curve": "线性"
+    },
+    "缩放+平移-右左": {
+        "scale": [1.0, 1.1],
+        "position": [(0.02, 0), (-0.02, 0)],
+        "curve": "线性"
+    },
+    "缩放+平移-上下": {
+        "scale": [1.0, 1.1],
+        "position": [(0, -0.02), (0, 0.02)],
+        "curve": "线性"
+    },
+    "缩放+平移-下上": {
+        "scale": [1.0, 1.1],
+        "position": [(0, 0.02), (0, -0.02)],
+        "curve": "线性"
+    },
+    "缩放+对角线-左上到右下": {
+        "scale": [1.0, 1.15],
+        "position": [(-0.015, -0.015), (0.015, 0.015)],
+        "curve": "线性"
+    },
+    "缩放+对角线-右上到左下": {
+        "scale": [1.0, 1.15],
+        "position": [(0.015, -0.015), (-0.015, 0.015)],
+        "curve": "线性"
+    },
+    "缩放+对角线-左下到右上": {
+        "scale": [1.0, 1.15],
+        "position": [(-0.015, 0.015), (0.015, -0.015)],
+        "curve": "线性"
+    },
+    "缩放+对角线-右下到左上": {
+        "scale": [1.0, 1.15],
+        "position": [(0.015, 0.015), (-0.015, -0.015)],
+        "curve": "线性"
+    },
+    "缩小+平移-左右": {
+        "scale": [1.1, 1.0],
+        "position": [(-0.02, 0), (0.02, 0)],
+        "curve": "线性"
+    },
+    "缩小+平移-右左": {
+        "scale": [1.1, 1.0],
+        "position": [(0.02, 0), (-0.02, 0)],
+        "curve": "线性"
+    },
+    "缩放-剧烈": {
+        "scale": [1.0, 1.25],
+        "position": [(0, 0), (0, 0)],
+        "curve": "线性"
+    },
+    "跳动": {
+        "scale": [1.0, 1.05],
+        "position": [(0, 0.01), (0, -0.01)],
+        "curve": "线性"
+    }
+})
+
+# "随机"缩放和位移可以选择的具体预设
+RANDOM_SCALE_NAMES = tuple(name for name, value in SCALE_PRESETS.items() if name != "无" and value is not None)
+RANDOM_POSITION_NAMES = tuple(name for name, value in POSITION_PRESETS.items() if name != "无" and value is not None)
 
 
 class AnimationService:
@@ -13,151 +207,126 @@ class AnimationService:
     提供各种动画预设和平滑过渡
     """
 
-    def __init__(self):
-        """初始化动画服务"""
+    def __init__(self, opencv_threads: Optional[int] = None):
+        """
+        初始化动画服务
+
+        Args:
+            opencv_threads: OpenCV处理图像使用的线程数，为None时保留一个核心给界面和视频编码。
+                多个进程同时渲染时应按进程数平分CPU核心
+        """
         # 默认帧率
         self.default_fps = 30
 
-        # 定义动画曲线函数
-        self.curve_functions = {
-            "线性": lambda t: t,  # 线性曲线
-            "缓入": lambda t: t**2,  # 缓入（慢开始，快结束）
-            "缓出": lambda t: 1 - (1 - t)**2,  # 缓出（快开始，慢结束）
-            "缓入缓出": lambda t: 3*(t**2) - 2*(t**3),  # 缓入缓出
-            "强缓入": lambda t: t**3,  # 更强烈的缓入
-            "强缓出": lambda t: 1 - (1 - t)**3,  # 更强烈的缓出
-            "平滑弹入": lambda t: 1 - np.cos(t * np.pi / 2),  # 平滑弹性进入
-            "平滑弹出": lambda t: np.sin(t * np.pi / 2),  # 平滑弹性退出
-            "随机": None  # 随机曲线标记，实际函数会在运行时确定
-        }
+        # OpenCV的线程数是进程级设置，同一进程中的所有实例共用
+        self.opencv_threads = opencv_threads or max(1, (os.cpu_count() or 2) - 1)
+        cv2.setNumThreads(self.opencv_threads)
 
-        # 缩放预设选项
-        self.scale_presets = {
-            "无": [1.0, 1.0],
-            "放大": [1.0, 1.2],
-            "缩小": [1.2, 1.0],
-            "轻微放大": [1.0, 1.1],
-            "轻微缩小": [1.1, 1.0],
-            "剧烈放大": [1.0, 1.25],
-            "脉动": [1.0, 1.05],
-            "随机": None  # 随机标记，实际值会在运行时确定
-        }
-        
-        # 平移预设选项
-        self.position_presets = {
-            "无": [(0, 0), (0, 0)],
-            "左到右": [(-0.02, 0), (0.02, 0)],
-            "右到左": [(0.02, 0), (-0.02, 0)],
-            "上到下": [(0, -0.02), (0, 0.02)],
-            "下到上": [(0, 0.02), (0, -0.02)],
-            "左上到右下": [(-0.015, -0.015), (0.015, 0.015)],
-            "右上到左下": [(0.015, -0.015), (-0.015, 0.015)],
-            "左下到右上": [(-0.015, 0.015), (0.015, -0.015)],
-            "右下到左上": [(0.015, 0.015), (-0.015, -0.015)],
-            "轻微左右": [(-0.01, 0), (0.01, 0)],
-            "轻微上下": [(0, -0.01), (0, 0.01)],
-            "随机": None  # 随机标记，实际值会在运行时确定
-        }
+        # OpenCL和CUDA设备在第一次逐帧处理时才检测（见use_opencl、use_cuda），
+        # 在创建服务后才fork的工作进程（如gunicorn --preload）中不会继承主进程的GPU上下文
+        self._use_opencl = None
+        self._use_cuda = None
+
+        # 已解码图片的缓存，键为(图片路径, 修改时间)，按最近使用顺序淘汰。
+        # 同一张图片重复预览或修改动画时无需重新读取和解码
+        self.image_cache_size = 8
+        self._image_cache = OrderedDict()
+        self._image_cache_lock = threading.Lock()
+        # 后台预读图片的线程，第一次预读时创建
+        self._prefetch_executor = None
+
+        # 曲线、缩放、位移和预设动画都是模块中定义的只读映射，所有实例和线程共享，无需加锁
+        self.curve_functions = CURVE_FUNCTIONS
+        self.scale_presets = SCALE_PRESETS
+        self.position_presets = POSITION_PRESETS
+        self.preset_animations = PRESET_ANIMATIONS
+
+    @property
+    def use_opencl(self) -> bool:
+        """有可用的OpenCL设备（通常是GPU）时，逐帧缩放在OpenCL设备上进行；第一次使用时检测"""
+        if self._use_opencl is None:
+            self._use_opencl = cv2.ocl.haveOpenCL()
+            cv2.ocl.setUseOpenCL(self._use_opencl)
+        return self._use_opencl
+
+    @property
+    def use_cuda(self) -> bool:
+        """有可用的CUDA设备时优先使用CUDA，源图片上传一次后每帧都在显存中缩放；第一次使用时检测"""
+        if self._use_cuda is None:
+            self._use_cuda = _has_cuda_device()
+        return self._use_cuda
+
+    @use_cuda.setter
+    def use_cuda(self, enabled: bool) -> None:
+        self._use_cuda = enabled
+
+    def load_image(self, image_path: Union[str, Path]) -> np.ndarray:
+        """
+        读取图片并转换为RGB(A)数组，结果按(路径, 修改时间)缓存
+
+        返回的数组是只读的，多个片段可以安全地共享同一份数据
+
+        Args:
+            image_path: 图片路径
+
+        Returns:
+            RGB或RGBA格式的uint8数组
+        """
+        image_path = str(image_path)
+        key = (image_path, os.path.getmtime(image_path))
+
+        with self._image_cache_lock:
+            image = self._image_cache.get(key)
+            if image is not None:
+                self._image_cache.move_to_end(key)
+                return image
+
+        # 通过imdecode读取，支持包含中文等非ASCII字符的路径
+        image = cv2.imdecode(np.fromfile(image_path, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+        if image is None:
+            raise ValueError(f"无法读取图片: {image_path}")
+
+        if image.dtype == np.uint16:
+            image = (image >> 8).astype(np.uint8)
+        if image.ndim == 2:
+            image = cv2.cvtColor(image, cv2.COLOR_GRAY2RGB)
+        elif image.shape[2] == 4:
+            image = cv2.cvtColor(image, cv2.COLOR_BGRA2RGBA)
+        else:
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        image.flags.writeable = False
+
+        with self._image_cache_lock:
+            # 同一路径的旧版本不会再被使用，直接移除
+            for old_key in [k for k in self._image_cache if k[0] == image_path]:
+                del self._image_cache[old_key]
+            self._image_cache[key] = image
+            while len(self._image_cache) > self.image_cache_size:
+                self._image_cache.popitem(last=False)
+
+        return image
+
+    def prefetch_image(self, image_path: Union[str, Path]) -> Future:
+        """
+        在后台线程中读取并解码图片，放入缓存，供之后的load_image直接使用
+
+        Args:
+            image_path: 图片路径
+
+        Returns:
+            完成时图片已在缓存中的Future；读取失败时不抛出异常，由之后的load_image报告错误
+        """
+        if self._prefetch_executor is None:
+            self._prefetch_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="image-prefetch")
+        return self._prefetch_executor.submit(self._prefetch, image_path)
+
+    def _prefetch(self, image_path: Union[str, Path]) -> None:
+        """读取图片到缓存，忽略错误"""
+        try:
+            self.load_image(image_path)
+        except Exception:
+            pass
 
-        # 定义预设动画效果（兼容原有代码）
-        self.preset_animations = {
-            "静止": {
-                "scale": [1.0, 1.0],
-                "position": [(0, 0), (0, 0)],
-                "curve": "线性"
-            },
-            "缩放-放大": {
-                "scale": [1.0, 1.2],
-                "position": [(0, 0), (0, 0)],
-                "curve": "线性"
-            },
-            "缩放-缩小": {
-                "scale": [1.2, 1.0],
-                "position": [(0, 0), (0, 0)],
-                "curve": "线性"
-            },
-            "平移-左到右": {
-                "scale": [1.0, 1.0],
-                "position": [(-0.02, 0), (0.02, 0)],
-                "curve": "线性"
-            },
-            "平移-右到左": {
-                "scale": [1.0, 1.0],
-                "position": [(0.02, 0), (-0.02, 0)],
-                "curve": "线性"
-            },
-            "平移-上到下": {
-                "scale": [1.0, 1.0],
-                "position": [(0, -0.02), (0, 0.02)],
-                "curve": "线性"
-            },
-            "平移-下到上": {
-                "scale": [1.0, 1.0],
-                "position": [(0, 0.02), (0, -0.02)],
-                "curve": "线性"
-            },
-            "缩放+平移-左右": {
-                "scale": [1.0, 1.1],
-                "position": [(-0.02, 0), (0.02, 0)],
-                "curve": "线性"
-            },
-            "缩放+平移-右左": {
-                "scale": [1.0, 1.1],
-                "position": [(0.02, 0), (-0.02, 0)],
-                "curve": "线性"
-            },
-            "缩放+平移-上下": {
-                "scale": [1.0, 1.1],
-                "position": [(0, -0.02), (0, 0.02)],
-                "curve": "线性"
-            },
-            "缩放+平移-下上": {
-                "scale": [1.0, 1.1],
-                "position": [(0, 0.02), (0, -0.02)],
-                "curve": "线性"
-            },
-            "缩放+对角线-左上到右下": {
-                "scale": [1.0, 1.15],
-                "position": [(-0.015, -0.015), (0.015, 0.015)],
-                "curve": "线性"
-            },
-            "缩放+对角线-右上到左下": {
-                "scale": [1.0, 1.15],
-                "position": [(0.015, -0.015), (-0.015, 0.015)],
-                "curve": "线性"
-            },
-            "缩放+对角线-左下到右上": {
-                "scale": [1.0, 1.15],
-                "position": [(-0.015, 0.015), (0.015, -0.015)],
-                "curve": "线性"
-            },
-            "缩放+对角线-右下到左上": {
-                "scale": [1.0, 1.15],
-                "position": [(0.015, 0.015), (-0.015, -0.015)],
-                "curve": "线性"
-            },
-            "缩小+平移-左右": {
-                "scale": [1.1, 1.0],
-                "position": [(-0.02, 0), (0.02, 0)],
-                "curve": "线性"
-            },
-            "缩小+平移-右左": {
-                "scale": [1.1, 1.0],
-                "position": [(0.02, 0), (-0.02, 0)],
-                "curve": "线性"
-            },
-            "缩放-剧烈": {
-                "scale": [1.0, 1.25],
-                "position": [(0, 0), (0, 0)],
-                "curve": "线性"
-            },
-            "跳动": {
-                "scale": [1.0, 1.05],
-                "position": [(0, 0.01), (0, -0.01)],
-                "curve": "线性"
-            }
-        }
-        
     def get_curve_function(self, curve_name: str) -> Callable[[float], float]:
         """
         获取指定名称的曲线函数
@@ -168,15 +337,138 @@ class AnimationService:
         Returns:
             曲线函数
         """
+        return self.curve_functions[self.resolve_curve_name(curve_name)]
+
+    def evaluate_curve(self, curve_name: str, t: Union[float, np.ndarray]) -> Union[float, np.ndarray]:
+        """
+        计算曲线在给定进度处的值，可以一次计算多个进度
+
+        Args:
+            curve_name: 曲线名称，"随机"会随机选择一个曲线
+            t: 动画进度，标量或numpy数组，取值范围[0, 1]
+
+        Returns:
+            与t形状相同的曲线值
+        """
+        return self.curve_functions[self.resolve_curve_name(curve_name)](t)
+
+    def resolve_curve_name(self, curve_name: str) -> str:
+        """
+        将曲线名称解析为实际使用的曲线名称
+
+        "随机"会随机选择一个具体的曲线，未知的名称使用"线性"
+
+        Args:
+            curve_name: 曲线名称
+
+        Returns:
+            实际使用的曲线名称
+        """
         if curve_name == "随机":
             # 当指定随机曲线时，随机选择一个曲线（除了"随机"本身）
-            curve_options = list(self.curve_functions.keys())
-            curve_options.remove("随机")
-            selected_curve = random.choice(curve_options)
-            print(f"随机选择曲线: '{selected_curve}'")
-            return self.curve_functions[selected_curve]
-            
-        return self.curve_functions.get(curve_name, self.curve_functions["线性"])
+            selected_curve = random.choice(RANDOM_CURVE_NAMES)
+            logger.debug("随机选择曲线: '%s'", selected_curve)
+            return selected_curve
+
+        return curve_name if curve_name in self.curve_functions else "线性"
+
+    def get_curve_lut(self, curve_name: str) -> np.ndarray:
+        """
+        获取曲线的查找表，用于逐帧线性插值代替调用曲线函数
+
+        Args:
+            curve_name: 已解析的曲线名称，不能是"随机"
+
+        Returns:
+            在[0, 1]区间上均匀采样的只读曲线值数组，长度为CURVE_LUT_SIZE + 1
+        """
+        return CURVE_LUTS[curve_name]
+
+    def is_static_animation(self, animation_settings: Optional[Dict]) -> bool:
+        """
+        检查动画设置是否没有任何缩放和位移
+
+        这样的片段每一帧都与原始图片相同，不需要逐帧计算变换
+
+        Args:
+            animation_settings: 动画设置，为None时视为静止
+
+        Returns:
+            是否为静止画面
+        """
+        if not animation_settings:
+            return True
+        start_scale, end_scale = animation_settings.get('scale', [1.0, 1.0])
+        (start_x, start_y), (end_x, end_y) = animation_settings.get('position', [(0, 0), (0, 0)])
+        return (start_scale == end_scale == 1.0
+                and start_x == start_y == end_x == end_y == 0)
+
+    def build_affine_stack(self, animation_settings: Dict, progress: np.ndarray,
+                           width: int, height: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        批量计算多个动画进度对应的仿射矩阵
+
+        所有帧的曲线、缩放和位移一次性用numpy计算，缩放和平移合并为一个矩阵，
+        每帧只需一次warpAffine
+
+        Args:
+            animation_settings: 动画设置，curve必须是已解析的曲线名称（不能是"随机"）
+            progress: 各帧的动画进度，取值范围[0, 1]
+            width: 画面宽度
+            height: 画面高度
+
+        Returns:
+            (仿射矩阵数组 (N, 2, 3) float32, 是否无需变换的布尔数组 (N,))
+        """
+        start_scale, end_scale = animation_settings.get('scale', [1.0, 1.0])
+        (start_x, start_y), (end_x, end_y) = animation_settings.get('position', [(0, 0), (0, 0)])
+
+        # 在曲线查找表中线性插值得到动画曲线值
+        curve_lut = self.get_curve_lut(animation_settings.get('curve', '线性'))
+        curve_values = np.interp(progress, CURVE_LUT_POINTS, curve_lut)
+
+        # 计算缩放值和位移
+        scales = start_scale + (end_scale - start_scale) * curve_values
+        xs = start_x + (end_x - start_x) * curve_values
+        ys = start_y + (end_y - start_y) * curve_values
+
+        has_shift = (xs != 0) | (ys != 0)
+        identity = (scales == 1.0) & ~has_shift
+        # 有平移时增加缩放，确保移动后不会露出黑边
+        zoom = np.where(
+            (scales != 1.0) & has_shift,
+            scales * np.maximum(1.0, np.maximum(1.0 + 2 * np.abs(xs), 1.0 + 2 * np.abs(ys))),
+            scales
+        )
+
+        # 先以画面中心缩放，再叠加平移分量
+        matrices = np.zeros((len(progress), 2, 3), dtype=np.float32)
+        matrices[:, 0, 0] = zoom
+        matrices[:, 1, 1] = zoom
+        matrices[:, 0, 2] = width * (1 - zoom) / 2 + xs * width
+        matrices[:, 1, 2] = height * (1 - zoom) / 2 + ys * height
+        return matrices, identity
+
+    def compose_matrix(self, animation_settings: Dict, progress: float,
+                       width: int, height: int) -> Tuple[np.ndarray, bool]:
+        """
+        计算单个动画进度对应的仿射矩阵
+
+        与build_affine_stack使用相同的计算，用于不在预先计算的帧时间上的时刻
+
+        Args:
+            animation_settings: 动画设置，curve必须是已解析的曲线名称（不能是"随机"）
+            progress: 动画进度，取值范围[0, 1]
+            width: 画面宽度
+            height: 画面高度
+
+        Returns:
+            (仿射矩阵 (2, 3) float32, 是否无需变换)
+        """
+        matrices, identity = self.build_affine_stack(
+            animation_settings, np.array([progress], dtype=np.float64), width, height
+        )
+        return matrices[0], bool(identity[0])
 
     def get_animation_settings(self, animation: Union[str, Dict]) -> Dict:
         """
@@ -194,26 +486,16 @@ class AnimationService:
 
     def get_random_scale(self) -> List:
         """获取随机缩放设置"""
-        scale_options = list(self.scale_presets.keys())
-        scale_options.remove("无")
-        if "随机" in scale_options:
-            scale_options.remove("随机")
-        
-        random_scale_name = random.choice(scale_options)
+        random_scale_name = random.choice(RANDOM_SCALE_NAMES)
         random_scale = self.scale_presets[random_scale_name]
-        print(f"随机选择缩放效果: '{random_scale_name}' -> 值={random_scale}")
+        logger.debug("随机选择缩放效果: '%s' -> 值=%s", random_scale_name, random_scale)
         return random_scale
     
     def get_random_position(self) -> List:
         """获取随机位移设置"""
-        position_options = list(self.position_presets.keys())
-        position_options.remove("无")
-        if "随机" in position_options:
-            position_options.remove("随机")
-        
-        random_position_name = random.choice(position_options)
+        random_position_name = random.choice(RANDOM_POSITION_NAMES)
         random_position = self.position_presets[random_position_name]
-        print(f"随机选择位移效果: '{random_position_name}' -> 值={random_position}")
+        logger.debug("随机选择位移效果: '%s' -> 值=%s", random_position_name, random_position)
         return random_position
     
     def combine_animation_settings(self, scale_preset: str, position_preset: str, curve: str) -> Dict:
@@ -228,11 +510,6 @@ class AnimationService:
         Returns:
             组合后的动画设置字典
         """
-        print(f"\n===== 动画参数 =====")
-        print(f"缩放预设: '{scale_preset}'")
-        print(f"平移预设: '{position_preset}'")
-        print(f"曲线函数: '{curve}'")
-        
         # 处理缩放预设
         if scale_preset == "随机":
             scale = self.get_random_scale()
@@ -252,8 +529,11 @@ class AnimationService:
             "curve": curve
         }
         
-        print(f"缩放参数: 起始={scale[0]:.2f}, 结束={scale[1]:.2f}")
-        print(f"平移参数: 起始=({position[0][0]:.3f}, {position[0][1]:.3f}), 结束=({position[1][0]:.3f}, {position[1][1]:.3f})")
-        print(f"====== 结束 ======\n")
+        # 动画参数只在调试日志中输出，关闭调试日志时不做任何格式化
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("动画参数: 缩放预设='%s', 平移预设='%s', 曲线函数='%s'", scale_preset, position_preset, curve)
+            logger.debug("缩放参数: 起始=%.2f, 结束=%.2f", scale[0], scale[1])
+            logger.debug("平移参数: 起始=(%.3f, %.3f), 结束=(%.3f, %.3f)",
+                         position[0][0], position[0][1], position[1][0], position[1][1])
         
         return animation_settings 
\ No newline at end of file
@@ -1,19 +1,107 @@
 import os
 from pathlib import Path
 from typing import Optional, List
+from concurrent.futures import ThreadPoolExecutor
 from gtts import gTTS
+import gtts.tts
+import requests
+import hashlib
+import io
+import logging
+import threading
+import wave
+import shutil
 import subprocess
 import platform
+import uuid
 import os.path
+from moviepy.config import get_setting
 from .path_service import PathService
 
+logger = logging.getLogger(__name__)
+
+
+class _PooledSession(requests.Session):
+    """在多次请求之间保持连接的会话，gTTS用完后调用close时不关闭连接池"""
+    
+    def close(self):
+        pass
+
+
+# gTTS每次请求都新建requests.Session，需要重新进行TCP和TLS握手。
+# 这里只替换gtts.tts模块中使用的Session，所有语音请求共用同一个连接池
+_GTTS_SESSION = _PooledSession()
+_GTTS_SESSION.mount("https://", requests.adapters.HTTPAdapter(pool_connections=8, pool_maxsize=8))
+
+
+class _GTTSRequests:
+    """gtts.tts中requests模块的替身，Session返回共享的会话，其余属性直接使用requests"""
+    
+    def __getattr__(self, name):
+        return getattr(requests, name)
+    
+    @staticmethod
+    def Session():
+        return _GTTS_SESSION
+
+
+if getattr(gtts.tts, "requests", None) is requests:
+    gtts.tts.requests = _GTTSRequests()
+
 class AudioService:
-    def __init__(self):
+    # 支持的语音合成引擎
+    ENGINES = ("auto", "piper", "gtts")
+    
+    def __init__(self, max_workers: int = 8, engine: str = "auto", piper_model: Optional[str] = None):
+        """
+        初始化音频服务
+        
+        Args:
+            max_workers: 批量生成语音时同时进行的最大请求数
+            engine: 语音合成引擎，"piper"使用本地的Piper模型，"gtts"使用Google Text-to-Speech，
+                "auto"在安装了piper-tts并配置了模型时使用Piper，否则使用gTTS
+            piper_model: Piper语音模型(.onnx)的路径，为None时读取环境变量PIPER_MODEL
+        """
+        if engine not in self.ENGINES:
+            raise ValueError(f"不支持的语音合成引擎: {engine}")
         self.path_service = PathService()
+        # 音频目录的字符串形式，生成语音时直接拼接文件路径，不再每次构造Path对象
+        self._audio_dir = str(self.path_service.audio_directory)
+        self.max_workers = max_workers
+        # 语音合成使用的语言
+        self.language = 'zh-cn'
+        # 本地Piper模型在第一次合成时加载，之后所有请求共用
+        self.piper_model = piper_model or os.environ.get("PIPER_MODEL")
+        self._piper_voice = None
+        self._piper_lock = threading.Lock()
+        self.engine = self._select_engine(engine)
+    
+    def _select_engine(self, engine: str) -> str:
+        """
+        确定实际使用的语音合成引擎
+        
+        Args:
+            engine: 指定的引擎名称
+            
+        Returns:
+            "piper"或"gtts"
+        """
+        if engine == "gtts":
+            return "gtts"
+        try:
+            import piper  # noqa: F401
+            available = bool(self.piper_model) and os.path.exists(self.piper_model)
+        except ImportError:
+            available = False
+        if available:
+            return "piper"
+        if engine == "piper":
+            logger.warning("Piper不可用（未安装piper-tts或未找到模型），改用gTTS")
+        return "gtts"
     
     def generate_speech(self, text: str, filename: str, image_name: str = None) -> Optional[Path]:
         """
-        使用 Google Text-to-Speech 生成语音
+        使用本地Piper模型或 Google Text-to-Speech 生成语音
         
         Args:
             text: 要转换的文本
@@ -24,10 +112,6 @@ class AudioService:
             成功返回音频文件路径，失败返回 None
         """
         try:
-            # 获取音频目录
-            audio_dir = self.path_service.audio_directory
-            audio_dir.mkdir(parents=True, exist_ok=True)
-            
             # 如果提供了图片名称，使用它作为音频文件名
             if image_name:
                 # 去除扩展名，如果有的话
@@ -36,20 +120,133 @@ class AudioService:
             else:
                 output_filename = filename
             
-            # 构建完整的输出路径
-            output_path = audio_dir / output_filename
+            # 构建完整的输出路径（音频目录由PathService在初始化时创建）
+            output_path = os.path.join(self._audio_dir, output_filename)
             
-            # 使用 gTTS 生成语音
-            tts = gTTS(text=text, lang='zh-cn')
-            tts.save(str(output_path))
+            # 相同文本只合成一次，之后直接使用缓存的音频
+            cache_path = self._get_cache_path(text)
+            if cache_path.exists():
+                logger.debug("使用缓存的音频: %s", cache_path.name)
+            else:
+                self._synthesize_to_cache(text, cache_path)
+            self._publish_audio(cache_path, output_path)
             
-            print(f"已生成音频: {output_path}")
-            return output_path
+            logger.debug("已生成音频: %s", output_path)
+            return Path(output_path)
             
         except Exception as e:
-            print(f"生成语音时出错: {str(e)}")
+            logger.error("生成语音时出错: %s", e)
             return None
     
+    @property
+    def cache_directory(self) -> Path:
+        """语音缓存目录"""
+        return self.path_service.audio_directory / ".cache"
+    
+    def _get_cache_path(self, text: str) -> Path:
+        """
+        获取文本对应的缓存文件路径，以语言和文本的SHA-256作为文件名
+        
+        Args:
+            text: 要转换的文本
+            
+        Returns:
+            缓存文件路径
+        """
+        # 不同引擎和模型合成的语音不同，分别缓存；gTTS沿用只包含语言的键
+        voice = self.language
+        if self.engine == "piper":
+            voice = f"piper:{os.path.basename(self.piper_model)}\0{voice}"
+        key = hashlib.sha256(f"{voice}\0{text}".encode("utf-8")).hexdigest()
+        return self.cache_directory / f"{key}.mp3"
+    
+    def _synthesize_to_cache(self, text: str, cache_path: Path) -> None:
+        """
+        使用当前引擎生成语音并写入缓存
+        
+        先写入临时文件再原子地替换，并发生成相同文本时不会读到不完整的文件
+        
+        Args:
+            text: 要转换的文本
+            cache_path: 缓存文件路径
+        """
+        if self.engine == "piper":
+            def save(path):
+                self._synthesize_piper(text, path)
+        else:
+            save = gTTS(text=text, lang=self.language).save
+        temp_path = cache_path.with_name(f"{cache_path.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            try:
+                save(str(temp_path))
+            except FileNotFoundError:
+                # 缓存目录不存在（首次使用或运行期间被删除）时创建
+                cache_path.parent.mkdir(parents=True, exist_ok=True)
+                save(str(temp_path))
+            os.replace(temp_path, cache_path)
+        except Exception:
+            if temp_path.exists():
+                temp_path.unlink()
+            raise
+    
+    def _get_piper_voice(self):
+        """加载Piper语音模型，只在第一次调用时加载"""
+        if self._piper_voice is None:
+            with self._piper_lock:
+                if self._piper_voice is None:
+                    from piper import PiperVoice
+                    self._piper_voice = PiperVoice.load(self.piper_model)
+        return self._piper_voice
+    
+    def _synthesize_piper(self, text: str, output_path: str) -> None:
+        """
+        使用本地Piper模型生成语音，并由ffmpeg编码为MP3
+        
+        Args:
+            text: 要转换的文本
+            output_path: 输出的MP3文件路径
+        """
+        voice = self._get_piper_voice()
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as wav_file:
+            # piper-tts 1.3起合成WAV的方法改名为synthesize_wav
+            if hasattr(voice, "synthesize_wav"):
+                voice.synthesize_wav(text, wav_file)
+            else:
+                voice.synthesize(text, wav_file)
+        
+        # 其他模块都按MP3处理音频文件，这里与gTTS的输出保持一致
+        if not os.path.isdir(os.path.dirname(output_path) or "."):
+            raise FileNotFoundError(output_path)
+        result = subprocess.run(
+            [get_setting("FFMPEG_BINARY"), "-y", "-hide_banner", "-loglevel", "error",
+             "-f", "wav", "-i", "pipe:0", "-c:a", "libmp3lame", "-q:a", "4", "-f", "mp3", output_path],
+            input=buffer.getvalue(), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"ffmpeg编码语音失败: {result.stderr.decode('utf-8', 'ignore')[-500:]}")
+    
+    def _publish_audio(self, cache_path: Path, output_path: str) -> None:
+        """
+        将缓存的音频放到输出路径，优先使用硬链接，不支持时复制文件
+        
+        Args:
+            cache_path: 缓存文件路径
+            output_path: 输出文件路径，已存在时会被替换
+        """
+        output_dir, output_name = os.path.split(output_path)
+        temp_path = os.path.join(output_dir, f".{output_name}.{uuid.uuid4().hex}.tmp")
+        try:
+            os.link(cache_path, temp_path)
+        except OSError:
+            # 跨文件系统或文件系统不支持硬链接
+            shutil.copyfile(cache_path, temp_path)
+        os.replace(temp_path, output_path)
+    
+    def clear_cache(self) -> None:
+        """清空语音缓存"""
+        shutil.rmtree(self.cache_directory, ignore_errors=True)
+    
     def preview_audio(self, audio_path: str):
         """
         预览音频文件
@@ -81,7 +278,8 @@ class AudioService:
         Returns:
             生成的音频文件路径列表
         """
-        results = []
+        # 先整理每个请求的参数，再并行生成
+        jobs = []
         for item in items:
             if 'text' in item:
                 # 从图片路径获取基本文件名，如果有
@@ -93,10 +291,14 @@ class AudioService:
                     image_name = os.path.basename(image_path)
                 
                 # 确定文件名
-                filename = item.get('filename', f"audio_{len(results)}.mp3")
-                
-                # 生成音频
-                audio_path = self.generate_speech(item['text'], filename, image_name)
-                if audio_path:
-                    results.append(str(audio_path))
-        return results 
\ No newline at end of file
+                filename = item.get('filename', f"audio_{len(jobs)}.mp3")
+                jobs.append((item['text'], filename, image_name))
+        
+        if not jobs:
+            return []
+        
+        # gTTS是网络请求，Piper推理和ffmpeg编码也会释放GIL，都可以使用线程并行；map保持输入顺序
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(jobs)))) as executor:
+            audio_paths = list(executor.map(lambda args: self.generate_speech(*args), jobs))
+        
+        return [str(audio_path) for audio_path in audio_paths if audio_path] 
\ No newline at end of file
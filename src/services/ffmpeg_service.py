@@ -0,0 +1,342 @@
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+from typing import Dict, List, Optional, Tuple
+
+from moviepy.config import get_setting
+from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+
+
+class FFmpegService:
+    """直接调用ffmpeg处理视频的服务，帧数据不经过Python"""
+
+    # 可以由ffmpeg的xfade滤镜实现的转场效果及其对应的xfade类型。
+    # 滑动转场中新画面覆盖在静止的旧画面上滑入（cover），而不是把旧画面推出（slide）
+    XFADE_TRANSITIONS = {
+        "淡入淡出": "fade",
+        "滑动-左": "coverleft",
+        "滑动-右": "coverright",
+        "滑动-上": "coverup",
+        "滑动-下": "coverdown",
+        "闪白过渡": "custom",
+    }
+
+    # 使用自定义表达式的xfade转场。P为转场进度，从1减小到0；A、B分别为前后两个画面的像素值。
+    # 闪白与TransitionService一致：前半段旧画面线性变为纯白，在中点切换到新画面后再由白色线性过渡。
+    # 画面为yuv420p，白色的亮度为235，色度为128
+    XFADE_EXPRESSIONS = {
+        "闪白过渡": (
+            "if(gt(P,0.5),"
+            "A*(2*P-1)+if(eq(PLANE,0),235,128)*(2-2*P),"
+            "B*(1-2*P)+if(eq(PLANE,0),235,128)*2*P)"
+        ),
+    }
+
+    # 按优先级尝试的硬件H.264编码器
+    HARDWARE_H264_ENCODERS = ("h264_nvenc", "h264_qsv", "h264_videotoolbox")
+
+    # 各H.264编码器使用的预设和附加参数
+    H264_ENCODER_SETTINGS = {
+        "libx264": ("medium", []),
+        "h264_nvenc": ("p4", ["-rc", "vbr", "-pix_fmt", "yuv420p"]),
+        "h264_qsv": ("medium", ["-pix_fmt", "nv12"]),
+        "h264_videotoolbox": ("medium", ["-pix_fmt", "yuv420p"]),
+    }
+
+    def __init__(self):
+        """初始化ffmpeg服务"""
+        # 与MoviePy使用同一个ffmpeg可执行文件
+        self.ffmpeg_binary = get_setting("FFMPEG_BINARY")
+        # ffprobe不一定随ffmpeg一起提供，找不到时不使用依赖它的功能
+        self.ffprobe_binary = shutil.which("ffprobe")
+        self._filters = None
+        self._h264_encoder = None
+
+    def has_filter(self, name: str) -> bool:
+        """
+        检查ffmpeg是否支持指定的滤镜
+
+        Args:
+            name: 滤镜名称
+
+        Returns:
+            是否支持
+        """
+        if self._filters is None:
+            try:
+                output = subprocess.run(
+                    [self.ffmpeg_binary, "-hide_banner", "-filters"],
+                    stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True
+                ).stdout.decode("utf-8", "ignore")
+                self._filters = {line.split()[1] for line in output.splitlines() if len(line.split()) > 2}
+            except (OSError, subprocess.CalledProcessError):
+                self._filters = set()
+        return name in self._filters
+
+    def get_h264_encoder(self) -> str:
+        """
+        获取可用的H.264编码器，优先使用硬件编码器
+
+        检测结果会被缓存，只在第一次调用时尝试编码。
+
+        Returns:
+            编码器名称，没有可用的硬件编码器时为libx264
+        """
+        if self._h264_encoder is None:
+            self._h264_encoder = "libx264"
+            for encoder in self.HARDWARE_H264_ENCODERS:
+                if self._test_encoder(encoder):
+                    self._h264_encoder = encoder
+                    break
+            print(f"使用H.264编码器: {self._h264_encoder}")
+        return self._h264_encoder
+
+    def get_encoder_settings(self, codec: str) -> Tuple[str, List[str]]:
+        """
+        获取编码器的预设和附加参数
+
+        Args:
+            codec: 编码器名称
+
+        Returns:
+            (预设, 附加的ffmpeg参数列表)
+        """
+        preset, params = self.H264_ENCODER_SETTINGS.get(codec, ("medium", []))
+        return preset, list(params)
+
+    def _test_encoder(self, encoder: str) -> bool:
+        """
+        尝试用指定编码器编码几帧画面，检查编码器和对应的硬件是否可用
+
+        Args:
+            encoder: 编码器名称
+
+        Returns:
+            是否可用
+        """
+        preset, params = self.get_encoder_settings(encoder)
+        command = [
+            self.ffmpeg_binary, "-hide_banner", "-loglevel", "error",
+            "-f", "lavfi", "-i", "color=black:size=256x256:rate=30",
+            "-frames:v", "2",
+            "-c:v", encoder, "-preset", preset, *params,
+            "-f", "null", "-"
+        ]
+        try:
+            result = subprocess.run(
+                command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=30
+            )
+        except (OSError, subprocess.TimeoutExpired):
+            return False
+        return result.returncode == 0
+
+    def supports_transitions(self, transition_names: List[str]) -> bool:
+        """
+        检查一组转场效果是否都能由ffmpeg滤镜实现
+
+        Args:
+            transition_names: 每个连接点的转场效果名称
+
+        Returns:
+            是否全部支持
+        """
+        if any(name != "无" and name not in self.XFADE_TRANSITIONS for name in transition_names):
+            return False
+        return all(name == "无" for name in transition_names) or self.has_filter("xfade")
+
+    def probe(self, path: str) -> Dict:
+        """
+        读取视频文件的基本信息
+
+        Args:
+            path: 视频文件路径
+
+        Returns:
+            包含duration、video_size、audio_found等字段的信息字典
+        """
+        return ffmpeg_parse_infos(path)
+
+    def probe_streams(self, path: str) -> Optional[Dict]:
+        """
+        使用ffprobe读取视频和音频流的编码参数
+
+        Args:
+            path: 视频文件路径
+
+        Returns:
+            包含video和audio编码参数的字典，无法读取时返回None
+        """
+        if not self.ffprobe_binary:
+            return None
+        try:
+            result = subprocess.run(
+                [self.ffprobe_binary, "-v", "error", "-show_streams", "-of", "json", path],
+                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True
+            )
+            streams = json.loads(result.stdout).get("streams", [])
+        except (OSError, ValueError, subprocess.CalledProcessError):
+            return None
+
+        video = next((st for st in streams if st.get("codec_type") == "video"), None)
+        audio = next((st for st in streams if st.get("codec_type") == "audio"), None)
+        if video is None:
+            return None
+        return {
+            "video": tuple(video.get(key) for key in ("codec_name", "profile", "width", "height", "pix_fmt", "r_frame_rate")),
+            "audio": tuple(audio.get(key) for key in ("codec_name", "sample_rate", "channels")) if audio else None,
+        }
+
+    def can_concat_copy(self, video_paths: List[str], resolution: Optional[Tuple[int, int]] = None) -> bool:
+        """
+        检查一组视频能否直接按流复制拼接（不重新编码）
+
+        要求所有视频的编码、分辨率、像素格式、帧率和音频参数完全一致
+
+        Args:
+            video_paths: 视频文件路径列表
+            resolution: 要求的输出分辨率，为None时不限制
+
+        Returns:
+            是否可以直接拼接
+        """
+        infos = [self.probe_streams(path) for path in video_paths]
+        if not infos or any(info is None for info in infos):
+            return False
+        if any(info != infos[0] for info in infos[1:]):
+            return False
+        if resolution and tuple(infos[0]["video"][2:4]) != tuple(resolution):
+            return False
+        return True
+
+    def concat_copy(self, video_paths: List[str], output_path: str) -> None:
+        """
+        使用concat分离器按流复制拼接视频，不重新编码
+
+        Args:
+            video_paths: 视频文件路径列表，编码参数需要完全一致
+            output_path: 输出文件路径
+        """
+        output_dir = os.path.dirname(os.path.abspath(output_path))
+        with tempfile.NamedTemporaryFile("w", suffix=".txt", dir=output_dir, delete=False, encoding="utf-8") as f:
+            for path in video_paths:
+                escaped = os.path.abspath(path).replace("'", "'\\''")
+                f.write(f"file '{escaped}'\n")
+            list_path = f.name
+
+        try:
+            command = [
+                self.ffmpeg_binary, "-y", "-hide_banner", "-loglevel", "error",
+                "-f", "concat", "-safe", "0", "-i", list_path,
+                "-c", "copy",
+                "-movflags", "+faststart",
+                output_path
+            ]
+            result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+            if result.returncode != 0:
+                raise RuntimeError(f"ffmpeg拼接视频失败: {result.stderr.decode('utf-8', 'ignore')[-500:]}")
+        finally:
+            os.unlink(list_path)
+
+    def merge_videos(
+        self,
+        video_paths: List[str],
+        output_path: str,
+        transition_names: List[str],
+        transition_duration: float,
+        bitrate: str,
+        resolution: Optional[Tuple[int, int]] = None,
+        infos: Optional[List[Dict]] = None,
+        fps: int = 30
+    ) -> None:
+        """
+        使用一个ffmpeg进程完成视频的缩放、转场和拼接
+
+        与TransitionService的效果保持一致：转场时将前一个片段的最后一段与当前片段的开头混合，
+        转场片段的时长与当前片段相同，音频使用当前片段的原始音频。
+
+        Args:
+            video_paths: 视频文件路径列表
+            output_path: 输出文件路径
+            transition_names: 每个连接点的转场效果名称，数量为片段数减一
+            transition_duration: 转场持续时间
+            bitrate: 视频码率
+            resolution: 输出分辨率，为None时使用所有片段中最大的宽高
+            infos: 已读取的视频信息，为None时自动读取
+            fps: 输出帧率
+        """
+        if infos is None:
+            infos = [self.probe(path) for path in video_paths]
+
+        if resolution:
+            width, height = resolution
+            # 缩放到指定分辨率
+            size_filter = f"scale={width}:{height}"
+        else:
+            # 与MoviePy的compose拼接方式一致：使用最大宽高，较小的片段居中显示在黑色背景上
+            width = max(info["video_size"][0] for info in infos)
+            height = max(info["video_size"][1] for info in infos)
+            size_filter = f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2"
+
+        filters = []
+        segments = []
+        for i, info in enumerate(infos):
+            duration = info["duration"]
+
+            # 统一尺寸、帧率、像素格式和时间基，xfade要求两路输入完全一致；
+            # 下一个连接点有转场时，额外复制一路用于截取结尾
+            normalize = f"[{i}:v]{size_filter},setsar=1,format=yuv420p,settb=AVTB,fps={fps}"
+            if i < len(transition_names) and transition_names[i] != "无":
+                filters.append(f"{normalize},split=2[v{i}][t{i}]")
+            else:
+                filters.append(f"{normalize}[v{i}]")
+
+            # 没有音轨的片段使用静音填充
+            if info.get("audio_found"):
+                filters.append(f"[{i}:a]aresample=44100,aformat=channel_layouts=stereo[a{i}]")
+            else:
+                filters.append(
+                    f"anullsrc=channel_layout=stereo:sample_rate=44100,atrim=duration={duration:.3f}[a{i}]"
+                )
+
+            name = transition_names[i - 1] if i > 0 else "无"
+            if name == "无":
+                segments.append(f"[v{i}][a{i}]")
+                continue
+
+            # 前一个片段的结尾与当前片段的开头混合，转场时长不超过两个片段的长度；
+            # trim会丢失帧率信息，需要重新指定，否则xfade无法配置
+            prev_duration = infos[i - 1]["duration"]
+            fade = min(transition_duration, prev_duration, duration)
+            filters.append(
+                f"[t{i - 1}]trim=start={prev_duration - fade:.3f},setpts=PTS-STARTPTS,fps={fps}[tail{i}]"
+            )
+            expression = self.XFADE_EXPRESSIONS.get(name)
+            filters.append(
+                f"[tail{i}][v{i}]xfade=transition={self.XFADE_TRANSITIONS[name]}"
+                + (f":expr='{expression}'" if expression else "")
+                + f":duration={fade:.3f}:offset=0[x{i}]"
+            )
+            segments.append(f"[x{i}][a{i}]")
+
+        filters.append(f"{''.join(segments)}concat=n={len(segments)}:v=1:a=1[outv][outa]")
+
+        codec = self.get_h264_encoder()
+        preset, encoder_params = self.get_encoder_settings(codec)
+
+        command = [self.ffmpeg_binary, "-y", "-hide_banner", "-loglevel", "error"]
+        for path in video_paths:
+            command += ["-i", path]
+        command += [
+            "-filter_complex", ";".join(filters),
+            "-map", "[outv]", "-map", "[outa]",
+            "-c:v", codec, "-preset", preset, *encoder_params, "-b:v", bitrate,
+            "-c:a", "aac",
+            "-movflags", "+faststart",
+            output_path
+        ]
+
+        result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        if result.returncode != 0:
+            raise RuntimeError(f"ffmpeg合并视频失败: {result.stderr.decode('utf-8', 'ignore')[-500:]}")
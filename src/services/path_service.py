@@ -17,7 +17,8 @@ class PathService:
         self.video_dir = self.output_dir / "video"
         self.audio_dir = self.output_dir / "audio"
         
-        # 创建所有必要的目录
+        # 创建所有必要的目录。PathService是单例，每个进程只在这里创建一次，
+        # 生成音频和视频时不再重复检查目录
         self.output_dir.mkdir(exist_ok=True)
         self.video_dir.mkdir(exist_ok=True)
         self.audio_dir.mkdir(exist_ok=True)
@@ -1,7 +1,11 @@
+import itertools
+import logging
+import os
 import random
 import numpy as np
 import cv2
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Optional, Callable, Tuple, Any, Union
 
 from moviepy.editor import VideoClip, VideoFileClip, ImageClip, concatenate_videoclips, CompositeVideoClip
@@ -9,6 +13,27 @@ from moviepy.editor import AudioFileClip, TextClip, ColorClip
 from moviepy.video.fx import all as vfx
 from moviepy.video.compositing import transitions
 
+from .animation_service import _has_cuda_device
+
+logger = logging.getLogger(__name__)
+
+def concatenate_clips(clips: List[VideoClip]) -> VideoClip:
+    """
+    按顺序连接视频片段
+
+    所有片段尺寸相同且都没有遮罩时直接按顺序取帧（chain），
+    不必每一帧都在画布上重新合成；否则使用compose，较小的片段居中显示在黑色背景上
+
+    Args:
+        clips: 视频片段列表
+
+    Returns:
+        连接后的视频片段
+    """
+    same_size = all(tuple(clip.size) == tuple(clips[0].size) for clip in clips)
+    has_mask = any(clip.mask is not None for clip in clips)
+    return concatenate_videoclips(clips, method="chain" if same_size and not has_mask else "compose")
+
 
 class TransitionService:
     """管理视频转场效果的服务"""
@@ -30,6 +55,45 @@ class TransitionService:
             "闪白过渡": lambda clip1, clip2, duration: self._flash_transition(clip1, clip2, duration),
             "随机": None  # 随机转场标记，实际函数会在运行时确定
         }
+        # 转场输出帧轮换使用的缓冲区数量，与VideoService的动画处理一致
+        self.frame_buffer_count = 3
+        # 转场时在后台计算前一个片段帧的线程，第一次使用时创建
+        self._frame_executor = None
+        # CUDA设备在第一次生成转场时才检测（见use_cuda），避免在fork工作进程之前创建GPU上下文
+        self._use_cuda = None
+        # "随机"转场可以选择的具体效果（除了"无"和"随机"本身），只计算一次
+        self.random_transition_names = tuple(
+            name for name in self.transitions if name not in ("无", "随机")
+        )
+    
+    @property
+    def use_cuda(self) -> bool:
+        """有可用的CUDA设备时，扭曲和旋转转场的变形与混合在显存中进行；第一次使用时检测"""
+        if self._use_cuda is None:
+            self._use_cuda = _has_cuda_device()
+        return self._use_cuda
+    
+    @use_cuda.setter
+    def use_cuda(self, enabled: bool) -> None:
+        self._use_cuda = enabled
+    
+    def resolve_transition_name(self, transition_name: str) -> str:
+        """
+        将"随机"解析为一个具体的转场效果名称
+        
+        Args:
+            transition_name: 转场效果名称
+            
+        Returns:
+            具体的转场效果名称，非"随机"时原样返回
+        """
+        if transition_name == "随机":
+            # 当指定随机转场时，随机选择一个转场效果
+            selected_transition = random.choice(self.random_transition_names)
+            print(f"随机选择转场效果: '{selected_transition}'")
+            return selected_transition
+        
+        return transition_name
     
     def get_transition_function(self, transition_name: str):
         """
@@ -42,16 +106,7 @@ class TransitionService:
             转场函数
         """
         if transition_name == "随机":
-            # 当指定随机转场时，随机选择一个转场效果（除了"无"和"随机"本身）
-            transition_options = list(self.transitions.keys())
-            if "无" in transition_options:
-                transition_options.remove("无")
-            if "随机" in transition_options:
-                transition_options.remove("随机")
-            
-            selected_transition = random.choice(transition_options)
-            print(f"随机选择转场效果: '{selected_transition}'")
-            return self.transitions[selected_transition]
+            return self.transitions[self.resolve_transition_name(transition_name)]
             
         return self.transitions.get(transition_name, self._no_transition)
     
@@ -189,10 +244,8 @@ class TransitionService:
                 final_clips.append(curr_clip)
                 continue
             
-            # 处理随机转场
-            if current_transition == "随机" or self.transitions.get(current_transition) == "random":
-                # 随机选择一个转场效果
-                trans_func = self.get_transition_function(current_transition)
+            # 处理随机转场：先确定具体的转场效果，再获取对应的转场函数
+            current_transition = self.resolve_transition_name(current_transition)
             
             # 获取转场函数
             transition_func = self.transitions.get(current_transition)
@@ -210,10 +263,92 @@ class TransitionService:
                 final_clips.append(transition_clip)
         
         # 连接所有片段，保留音频
-        final_clip = concatenate_videoclips(final_clips, method="compose")
+        final_clip = concatenate_clips(final_clips)
         
         return final_clip
     
+    def _get_transition_frames(self, clip1: VideoClip, clip2: VideoClip, duration: float,
+                               t: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        获取转场时刻前一个片段的结尾帧和当前片段的帧
+        
+        两个片段的帧互不依赖，且动画缩放等计算都在OpenCV中进行并释放GIL，
+        因此前一个片段的帧在后台线程中计算，与当前片段的帧同时进行
+        
+        Args:
+            clip1: 前一个视频片段
+            clip2: 当前视频片段
+            duration: 转场持续时间
+            t: 当前片段中的时间
+            
+        Returns:
+            (前一个片段的帧, 当前片段的帧)
+        """
+        if self._frame_executor is None:
+            self._frame_executor = ThreadPoolExecutor(
+                max_workers=max(1, min(4, (os.cpu_count() or 2) - 1)),
+                thread_name_prefix="transition-frame"
+            )
+        future = self._frame_executor.submit(clip1.get_frame, clip1.duration - duration + t)
+        frame2 = clip2.get_frame(t)
+        return future.result(), frame2
+    
+    def _blend_on_cuda(self, gpu: Dict, frame1: np.ndarray, frame2: np.ndarray, weight1: float,
+                       weight2: float, out: np.ndarray,
+                       warp1: Optional[Callable] = None, warp2: Optional[Callable] = None) -> np.ndarray:
+        """
+        在CUDA设备上混合两帧，混合前可以分别对两帧进行变形
+        
+        Args:
+            gpu: 转场片段专用的显存缓冲区字典，在多帧之间复用
+            frame1: 第一帧
+            frame2: 第二帧
+            weight1: 第一帧的权重
+            weight2: 第二帧的权重
+            out: 接收结果的输出帧
+            warp1: 对第一帧的变形函数，参数为(源GpuMat, 目标GpuMat)
+            warp2: 对第二帧的变形函数，参数同上
+            
+        Returns:
+            混合后的帧（即out）
+        """
+        for key in ('src1', 'src2', 'warp1', 'warp2', 'out'):
+            if key not in gpu:
+                gpu[key] = cv2.cuda_GpuMat()
+        gpu['src1'].upload(frame1)
+        gpu['src2'].upload(frame2)
+        src1, src2 = gpu['src1'], gpu['src2']
+        if warp1 is not None:
+            warp1(src1, gpu['warp1'])
+            src1 = gpu['warp1']
+        if warp2 is not None:
+            warp2(src2, gpu['warp2'])
+            src2 = gpu['warp2']
+        cv2.cuda.addWeighted(src1, weight1, src2, weight2, 0, dst=gpu['out'])
+        return gpu['out'].download(dst=out)
+    
+    def _create_frame_buffers(self) -> Callable[[np.ndarray], np.ndarray]:
+        """
+        创建一组轮换使用的输出帧缓冲区，每个转场片段单独使用一组
+        
+        MoviePy可能在短时间内持有返回的帧，因此轮换使用多个缓冲区，而不是只复用一个
+        
+        Returns:
+            函数，参数为参考帧，返回与其形状和类型相同的缓冲区
+        """
+        buffers = {}
+        
+        def next_buffer(frame):
+            if buffers.get('shape') != (frame.shape, frame.dtype):
+                buffers['shape'] = (frame.shape, frame.dtype)
+                buffers['ring'] = itertools.cycle([
+                    np.empty(frame.shape, dtype=frame.dtype)
+                    for _ in range(self.frame_buffer_count)
+                ])
+            return next(buffers['ring'])
+        
+        return next_buffer
+    
     # === 转场效果实现 ===
     
     def _crossfade(self, clip1: VideoClip, clip2: VideoClip, duration: float) -> VideoClip:
@@ -221,18 +356,19 @@ class TransitionService:
         交叉淡入淡出效果
         从clip1平滑过渡到clip2
         """
+        next_buffer = self._create_frame_buffers()
+        
         # 定义淡入淡出效果函数
-        def crossfade_effect(get_frame, t):
+        def crossfade_effect(t):
             # 如果在转场区域内
             if t < duration:
                 progress = t / duration
                 
                 # 获取前一个片段的最后一帧和当前片段的第一帧
-                frame1 = clip1.get_frame(clip1.duration - duration + t)
-                frame2 = clip2.get_frame(t)
+                frame1, frame2 = self._get_transition_frames(clip1, clip2, duration, t)
                 
                 # 使用OpenCV的addWeighted进行帧混合
-                result = cv2.addWeighted(frame1, 1-progress, frame2, progress, 0)
+                result = cv2.addWeighted(frame1, 1-progress, frame2, progress, 0, dst=next_buffer(frame1))
                 return result
             else:
                 # 转场结束后直接返回当前帧
@@ -240,7 +376,7 @@ class TransitionService:
         
         # 创建新片段
         new_clip = VideoClip(
-            lambda t: crossfade_effect(None, t),
+            crossfade_effect,
             duration=clip2.duration
         )
         
@@ -264,36 +400,40 @@ class TransitionService:
         Returns:
             包含转场效果的视频片段
         """
+        next_buffer = self._create_frame_buffers()
+        
         # 定义滑动函数
-        def slide_effect(get_frame, t):
+        def slide_effect(t):
             # 如果在转场区域内
             if t < duration:
                 progress = t / duration
                 
                 # 获取前一个片段的最后一帧和当前片段的第一帧
-                frame1 = clip1.get_frame(clip1.duration - duration + t)
-                frame2 = clip2.get_frame(t)
+                frame1, frame2 = self._get_transition_frames(clip1, clip2, duration, t)
                 
                 h, w = frame1.shape[:2]
-                result = frame1.copy()
+                result = next_buffer(frame1)
                 
-                # 计算滑动偏移
+                # 计算滑动偏移，输出帧的每个像素只写入一次：
+                # 新帧滑入的部分来自frame2，其余部分保留frame1
                 if direction == 'left':
                     offset_x = int(w * (1 - progress))
-                    frame2_visible = frame2[:, :max(0, w-offset_x)]
-                    result[:, offset_x:] = frame2_visible
+                    result[:, :offset_x] = frame1[:, :offset_x]
+                    result[:, offset_x:] = frame2[:, :w-offset_x]
                 elif direction == 'right':
                     offset_x = int(w * (1 - progress))
-                    frame2_visible = frame2[:, offset_x:]
-                    result[:, :min(w, w-offset_x)] = frame2_visible
+                    result[:, :w-offset_x] = frame2[:, offset_x:]
+                    result[:, w-offset_x:] = frame1[:, w-offset_x:]
                 elif direction == 'top':
                     offset_y = int(h * (1 - progress))
-                    frame2_visible = frame2[:max(0, h-offset_y), :]
-                    result[offset_y:, :] = frame2_visible
+                    result[:offset_y] = frame1[:offset_y]
+                    result[offset_y:] = frame2[:h-offset_y]
                 elif direction == 'bottom':
                     offset_y = int(h * (1 - progress))
-                    frame2_visible = frame2[offset_y:, :]
-                    result[:min(h, h-offset_y), :] = frame2_visible
+                    result[:h-offset_y] = frame2[offset_y:]
+                    result[h-offset_y:] = frame1[h-offset_y:]
+                else:
+                    np.copyto(result, frame1)
                 
                 return result
             else:
@@ -302,7 +442,7 @@ class TransitionService:
         
         # 创建新片段
         new_clip = VideoClip(
-            lambda t: slide_effect(None, t),
+            slide_effect,
             duration=clip2.duration
         )
         
@@ -317,30 +457,46 @@ class TransitionService:
         缩放淡入效果
         从clip1平滑过渡到clip2，clip2从小到大缩放进入
         """
+        next_buffer = self._create_frame_buffers()
+        
+        # 缩放后的画面贴到黑色画布上，画布按帧尺寸缓存
+        canvas = {}
+        
         # 定义缩放函数
-        def zoom_effect(get_frame, t):
+        def zoom_effect(t):
             # 如果在转场区域内
             if t < duration:
                 progress = t / duration
                 
                 # 获取前一个片段的最后一帧和当前片段的第一帧
-                frame1 = clip1.get_frame(clip1.duration - duration + t)
-                frame2 = clip2.get_frame(t)
+                frame1, frame2 = self._get_transition_frames(clip1, clip2, duration, t)
                 
-                # 对第二个帧应用缩放
+                # 对第二个帧应用以画面中心为基准的缩放：缩小后居中贴到黑色画布上，
+                # 使用resize比通用的warpAffine快得多
                 h, w = frame2.shape[:2]
-                center = (w/2, h/2)
                 zoom_factor = 0.5 + 0.5 * progress
+                new_w = max(1, int(round(w * zoom_factor)))
+                new_h = max(1, int(round(h * zoom_factor)))
+                x = (w - new_w) // 2
+                y = (h - new_h) // 2
                 
-                # 创建缩放矩阵
-                M = np.float32([
-                    [zoom_factor, 0, center[0]*(1-zoom_factor)],
-                    [0, zoom_factor, center[1]*(1-zoom_factor)]
-                ])
-                zoomed_frame2 = cv2.warpAffine(frame2, M, (w, h))
+                if canvas.get('shape') != (frame2.shape, frame2.dtype):
+                    canvas['shape'] = (frame2.shape, frame2.dtype)
+                    canvas['frame'] = np.zeros_like(frame2)
+                    canvas['rect'] = (0, 0, 0, 0)
+                zoomed_frame2 = canvas['frame']
+                # 画面随时间逐渐变大，通常会完全覆盖上一帧的区域；
+                # 倒退取帧时上一帧的区域更大，需要先清除
+                px, py, pw, ph = canvas['rect']
+                if x > px or y > py or x + new_w < px + pw or y + new_h < py + ph:
+                    zoomed_frame2[py:py + ph, px:px + pw] = 0
+                canvas['rect'] = (x, y, new_w, new_h)
+                zoomed_frame2[y:y + new_h, x:x + new_w] = cv2.resize(
+                    frame2, (new_w, new_h), interpolation=cv2.INTER_LINEAR
+                )
                 
                 # 根据进度混合两个帧
-                result = cv2.addWeighted(frame1, 1-progress, zoomed_frame2, progress, 0)
+                result = cv2.addWeighted(frame1, 1-progress, zoomed_frame2, progress, 0, dst=next_buffer(frame1))
                 return result
             else:
                 # 转场结束后直接返回当前帧
@@ -348,7 +504,7 @@ class TransitionService:
         
         # 创建新片段
         new_clip = VideoClip(
-            lambda t: zoom_effect(None, t),
+            zoom_effect,
             duration=clip2.duration
         )
         
@@ -363,15 +519,19 @@ class TransitionService:
         旋转淡入效果
         从clip1平滑过渡到clip2，clip2旋转进入
         """
+        next_buffer = self._create_frame_buffers()
+        
+        # 使用CUDA时的显存缓冲区，出错后改用CPU处理
+        gpu = {'enabled': self.use_cuda}
+        
         # 定义旋转函数
-        def rotate_effect(get_frame, t):
+        def rotate_effect(t):
             # 如果在转场区域内
             if t < duration:
                 progress = t / duration
                 
                 # 获取前一个片段的最后一帧和当前片段的第一帧
-                frame1 = clip1.get_frame(clip1.duration - duration + t)
-                frame2 = clip2.get_frame(t)
+                frame1, frame2 = self._get_transition_frames(clip1, clip2, duration, t)
                 
                 # 对第二个帧应用旋转
                 h, w = frame2.shape[:2]
@@ -379,10 +539,24 @@ class TransitionService:
                 angle = 90 * (1 - progress)
                 
                 rot_mat = cv2.getRotationMatrix2D(center, angle, progress)
+                
+                if gpu['enabled']:
+                    try:
+                        return self._blend_on_cuda(
+                            gpu, frame1, frame2, 1-progress, progress, next_buffer(frame1),
+                            warp2=lambda src, dst: cv2.cuda.warpAffine(src, rot_mat, (w, h), dst=dst)
+                        )
+                    except cv2.error as e:
+                        # 只记录一次，之后的帧和转场都直接使用CPU
+                        logger.warning("CUDA处理转场失败，改用CPU: %s", e)
+                        gpu.clear()
+                        gpu['enabled'] = False
+                        self.use_cuda = False
+                
                 rotated_frame2 = cv2.warpAffine(frame2, rot_mat, (w, h))
                 
                 # 根据进度混合两个帧
-                result = cv2.addWeighted(frame1, 1-progress, rotated_frame2, progress, 0)
+                result = cv2.addWeighted(frame1, 1-progress, rotated_frame2, progress, 0, dst=next_buffer(frame1))
                 return result
             else:
                 # 转场结束后直接返回当前帧
@@ -390,7 +564,7 @@ class TransitionService:
         
         # 创建新片段
         new_clip = VideoClip(
-            lambda t: rotate_effect(None, t),
+            rotate_effect,
             duration=clip2.duration
         )
         
@@ -405,36 +579,44 @@ class TransitionService:
         百叶窗效果
         从clip1平滑过渡到clip2，模拟百叶窗打开效果
         """
+        next_buffer = self._create_frame_buffers()
+        
         # 定义百叶窗效果函数
-        def blinds_effect(get_frame, t):
+        def blinds_effect(t):
             # 如果在转场区域内
             if t < duration:
                 progress = t / duration
                 
                 # 获取前一个片段的最后一帧和当前片段的第一帧
-                frame1 = clip1.get_frame(clip1.duration - duration + t)
-                frame2 = clip2.get_frame(t)
+                frame1, frame2 = self._get_transition_frames(clip1, clip2, duration, t)
                 
                 h, w = frame1.shape[:2]
-                result = frame1.copy()
+                result = next_buffer(frame1)
                 
                 # 创建百叶窗效果
                 num_blinds = 20
                 blind_height = h // num_blinds
                 
-                for i in range(num_blinds):
+                # 一次计算所有百叶窗的开合程度
+                blind_progress = np.minimum(1.0, progress * 2 - np.arange(num_blinds) / num_blinds)
+                
+                # 每个百叶窗直接写入输出帧的对应行：完全打开的复制新帧，未打开的复制旧帧，
+                # 其余的混合结果直接写入输出帧，不产生临时数组
+                for i, value in enumerate(blind_progress.tolist()):
                     y_start = i * blind_height
                     y_end = min((i + 1) * blind_height, h)
-                    
-                    # 控制每个百叶窗的开合程度
-                    blind_progress = min(1, progress * 2 - i / num_blinds)
-                    if blind_progress > 0:
-                        # 只替换当前百叶窗部分
-                        result[y_start:y_end, :] = cv2.addWeighted(
-                            frame1[y_start:y_end, :], 1-blind_progress,
-                            frame2[y_start:y_end, :], blind_progress,
-                            0
+                    if value >= 1:
+                        result[y_start:y_end] = frame2[y_start:y_end]
+                    elif value > 0:
+                        cv2.addWeighted(
+                            frame1[y_start:y_end], 1 - value,
+                            frame2[y_start:y_end], value,
+                            0, dst=result[y_start:y_end]
                         )
+                    else:
+                        result[y_start:y_end] = frame1[y_start:y_end]
+                # 不足一个百叶窗高度的剩余行保持旧帧
+                result[num_blinds * blind_height:] = frame1[num_blinds * blind_height:]
                 
                 return result
             else:
@@ -443,7 +625,7 @@ class TransitionService:
         
         # 创建新片段
         new_clip = VideoClip(
-            lambda t: blinds_effect(None, t),
+            blinds_effect,
             duration=clip2.duration
         )
         
@@ -458,37 +640,65 @@ class TransitionService:
         扭曲溶解效果
         从clip1平滑过渡到clip2，带有扭曲效果
         """
+        next_buffer = self._create_frame_buffers()
+        
+        # 像素坐标网格按帧尺寸缓存，只在第一帧创建
+        grid = {}
+        # 使用CUDA时的显存缓冲区，出错后改用CPU处理
+        gpu = {'enabled': self.use_cuda}
+        
+        def remap_on_cuda(src, dst):
+            gpu.setdefault('map_x', cv2.cuda_GpuMat()).upload(grid['map_x'])
+            gpu.setdefault('map_y', cv2.cuda_GpuMat()).upload(grid['map_y'])
+            cv2.cuda.remap(src, gpu['map_x'], gpu['map_y'], cv2.INTER_LINEAR, dst=dst)
+        
         # 定义扭曲溶解函数
-        def warp_effect(get_frame, t):
+        def warp_effect(t):
             # 如果在转场区域内
             if t < duration:
                 progress = t / duration
                 
                 # 获取前一个片段的最后一帧和当前片段的第一帧并应用扭曲效果
-                frame1 = clip1.get_frame(clip1.duration - duration + t)
-                frame2 = clip2.get_frame(t)
+                frame1, frame2 = self._get_transition_frames(clip1, clip2, duration, t)
                 
                 h, w = frame1.shape[:2]
                 
-                # 创建扭曲网格
-                map_x = np.zeros((h, w), np.float32)
-                map_y = np.zeros((h, w), np.float32)
+                # 创建扭曲网格：水平偏移只与行有关，垂直偏移只与列有关，
+                # 按行向量和列向量计算后广播到整个画面
+                if grid.get('size') != (h, w):
+                    grid['size'] = (h, w)
+                    grid['ys'] = np.arange(h, dtype=np.float64).reshape(-1, 1)
+                    grid['xs'] = np.arange(w, dtype=np.float64).reshape(1, -1)
+                    grid['map_x'] = np.empty((h, w), np.float32)
+                    grid['map_y'] = np.empty((h, w), np.float32)
+                ys, xs = grid['ys'], grid['xs']
+                map_x, map_y = grid['map_x'], grid['map_y']
+                
+                # 添加基于时间的扭曲
+                offset_x = 10 * np.sin(ys / 30 + progress * 10) * (1 - progress)
+                offset_y = 10 * np.cos(xs / 30 + progress * 10) * (1 - progress)
+                np.add(xs, offset_x, out=map_x, casting='same_kind')
+                np.add(ys, offset_y, out=map_y, casting='same_kind')
                 
-                for y in range(h):
-                    for x in range(w):
-                        # 添加基于时间的扭曲
-                        offset_x = 10 * np.sin(y/30 + progress * 10) * (1 - progress)
-                        offset_y = 10 * np.cos(x/30 + progress * 10) * (1 - progress)
-                        
-                        map_x[y, x] = x + offset_x
-                        map_y[y, x] = y + offset_y
+                if gpu['enabled']:
+                    try:
+                        return self._blend_on_cuda(
+                            gpu, frame1, frame2, 1-progress, progress, next_buffer(frame1),
+                            warp1=remap_on_cuda
+                        )
+                    except cv2.error as e:
+                        # 只记录一次，之后的帧和转场都直接使用CPU
+                        logger.warning("CUDA处理转场失败，改用CPU: %s", e)
+                        gpu.clear()
+                        gpu['enabled'] = False
+                        self.use_cuda = False
                 
                 # 分别对两个帧应用扭曲
                 warped1 = cv2.remap(frame1, map_x, map_y, cv2.INTER_LINEAR)
                 warped2 = frame2  # 新帧不扭曲
                 
                 # 根据进度混合两个帧
-                result = cv2.addWeighted(warped1, 1-progress, warped2, progress, 0)
+                result = cv2.addWeighted(warped1, 1-progress, warped2, progress, 0, dst=next_buffer(warped1))
                 return result
             else:
                 # 转场结束后直接返回当前帧
@@ -496,7 +706,7 @@ class TransitionService:
         
         # 创建新片段
         new_clip = VideoClip(
-            lambda t: warp_effect(None, t),
+            warp_effect,
             duration=clip2.duration
         )
         
@@ -511,33 +721,31 @@ class TransitionService:
         闪白过渡效果
         从clip1过渡到clip2，中间经过白色闪光
         """
+        next_buffer = self._create_frame_buffers()
+        
         # 定义闪白效果函数
-        def flash_effect(get_frame, t):
+        def flash_effect(t):
             # 如果在转场区域内
             if t < duration:
                 progress = t / duration
                 
                 # 获取前一个片段的最后一帧和当前片段的第一帧
-                frame1 = clip1.get_frame(clip1.duration - duration + t)
-                frame2 = clip2.get_frame(t)
+                frame1, frame2 = self._get_transition_frames(clip1, clip2, duration, t)
                 
-                # 创建闪白效果
+                # 创建闪白效果：与白色混合即 frame * (1 - w) + 255 * w，
+                # 用convertScaleAbs一次完成，不需要构造白色帧
                 if progress < 0.5:
                     # 前半部分：前一帧逐渐变白
                     white_intensity = progress * 2
-                    result = cv2.addWeighted(
-                        frame1, 1 - white_intensity,
-                        np.ones_like(frame1) * 255, white_intensity,
-                        0
-                    )
+                    frame = frame1
                 else:
                     # 后半部分：从白色过渡到新帧
                     white_intensity = 2 - progress * 2
-                    result = cv2.addWeighted(
-                        frame2, 1 - white_intensity,
-                        np.ones_like(frame2) * 255, white_intensity,
-                        0
-                    )
+                    frame = frame2
+                result = cv2.convertScaleAbs(
+                    frame, next_buffer(frame),
+                    alpha=1 - white_intensity, beta=255 * white_intensity
+                )
                 
                 return result
             else:
@@ -546,7 +754,7 @@ class TransitionService:
         
         # 创建新片段
         new_clip = VideoClip(
-            lambda t: flash_effect(None, t),
+            flash_effect,
             duration=clip2.duration
         )
         
@@ -1,7 +1,10 @@
 from moviepy.editor import (ImageClip, AudioFileClip, concatenate_videoclips, 
                           VideoFileClip, CompositeVideoClip, vfx, transfx, VideoClip)
+from moviepy.video.io.ffmpeg_writer import FFMPEG_VideoWriter
 from pathlib import Path
 from typing import List, Dict, Union, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import multiprocessing
 import os
 import subprocess
 import platform
@@ -13,6 +16,9 @@ import cv2
 import uuid
 import traceback
 import datetime
+import itertools
+import tempfile
+import logging
 import os.path
 
 # 修复 Pillow 兼容性问题
@@ -23,32 +29,86 @@ except AttributeError:
 
 from ..models.image_item import ImageItem
 from .animation_service import AnimationService
-from .transition_service import TransitionService
+from .transition_service import TransitionService, concatenate_clips
+from .ffmpeg_service import FFmpegService
 from .path_service import PathService
 
+logger = logging.getLogger(__name__)
+
+# 动画逐帧缩放使用的插值方式：预览使用计算量更小的双线性插值，高质量输出使用双三次插值
+ANIMATION_INTERPOLATION = {
+    "preview": cv2.INTER_LINEAR,
+    "high": cv2.INTER_CUBIC,
+}
+
+# 最终输出时可以通过高级选项指定的插值方式
+RESAMPLE_INTERPOLATION = {
+    "linear": cv2.INTER_LINEAR,
+    "cubic": cv2.INTER_CUBIC,
+    "lanczos": cv2.INTER_LANCZOS4,
+}
+
+# 各输出质量对应的视频码率
+OUTPUT_BITRATES = {
+    "low": "1000k",
+    "medium": "2500k",
+    "high": "5000k",
+}
+
+# 并行渲染片段的最大进程数，留一个核心给界面和最终合并
+MAX_SEGMENT_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+
+# 中间片段只用于最终合并时的再次编码，使用最快的预设和较高的质量
+SEGMENT_PRESET = "ultrafast"
+SEGMENT_FFMPEG_PARAMS = ["-crf", "16"]
+
+# 预览片段只用于查看效果，降低帧率并使用最快的编码预设
+PREVIEW_FPS = 24
+PREVIEW_PRESET = "ultrafast"
+PREVIEW_FFMPEG_PARAMS = ["-crf", "28"]
+
 class VideoService:
     """视频服务，处理视频的生成和编辑"""
     
-    def __init__(self):
+    def __init__(self, threads: Optional[int] = None):
+        """
+        初始化视频服务
+        
+        Args:
+            threads: 逐帧处理和视频编码使用的CPU线程数，为None时按单进程使用整台机器设置；
+                在进程池中同时渲染时由init_render_worker按进程数平分
+        """
         self.path_service = PathService()
         self.default_duration = 5  # 默认每个片段的持续时间
         self.default_fps = 30      # 默认帧率
+        self.frame_buffer_count = 3  # 动画处理时轮换使用的输出帧缓冲区数量
+        self.encode_threads = threads or min(4, os.cpu_count() or 2)  # 单个片段编码时ffmpeg使用的线程数
+        # 合成视频时已打开的音频，键为(音频路径, 修改时间)；多个片段使用同一音频时共用一个读取进程，
+        # 视频合成结束后统一关闭
+        self._audio_clips = {}
         
         # 初始化动画服务
-        self.animation_service = AnimationService()
+        self.animation_service = AnimationService(opencv_threads=threads)
         
         # 初始化转场服务
         self.transition_service = TransitionService()
         
         # 提供对所有转场的访问
         self.transitions = self.transition_service.transitions
+        
+        # 初始化ffmpeg服务，用于不经过Python逐帧处理的视频合并
+        self.ffmpeg_service = FFmpegService()
     
-    def create_clip(self, item: Dict) -> VideoClip:
+    def create_clip(self, item: Union[Dict, ImageItem], canvas_size: Optional[Tuple[int, int]] = None,
+                    interpolation: int = cv2.INTER_LINEAR) -> VideoClip:
         """
         为单个图片创建视频片段，支持各种效果
         
         Args:
             item: 包含图片路径、持续时间、音频路径、动画效果等
+            canvas_size: 片段最终输出的分辨率 (width, height)，指定时过大的图片会先缩小，
+                片段直接生成为该分辨率
+            interpolation: 动画缩放使用的OpenCV插值方式
             
         Returns:
             创建的视频片段
@@ -79,49 +139,222 @@ class VideoService:
                 audio_path = str(audio_path)
             
             if os.path.exists(audio_path):
-                audio_clip = AudioFileClip(audio_path)
+                audio_clip = self._load_audio_clip(audio_path)
                 audio_duration = audio_clip.duration
-                print(f"检测到音频: {audio_path}, 时长: {audio_duration:.2f}秒")
+                logger.debug("检测到音频: %s, 时长: %.2f秒", audio_path, audio_duration)
         
         # 确定视频片段时长：优先使用音频时长，其次是用户指定时长，最后是默认时长
         if audio_duration > 0:
             duration = audio_duration
-            print(f"使用音频时长 {duration:.2f}秒 作为视频片段时长")
+            logger.debug("使用音频时长 %.2f秒 作为视频片段时长", duration)
         else:
             duration = item.get("duration", self.default_duration)
-            print(f"使用指定时长 {duration:.2f}秒 作为视频片段时长")
-        
-        # 加载图像
-        image_clip = ImageClip(image_path).set_duration(duration)
+            logger.debug("使用指定时长 %.2f秒 作为视频片段时长", duration)
         
-        # 应用动画效果
+        # 获取动画设置
         animation = item.get("animation")
-        if animation:
-            # 获取动画设置
-            animation_settings = self.animation_service.get_animation_settings(animation)
-            # 打印动画设置
-            print(f"应用动画效果: {animation_settings}")
-            # 获取并打印曲线参数（用于调试）
-            curve_name = animation_settings.get('curve', '线性')
-            curve_func = self.animation_service.get_curve_function(curve_name)
-            print(f"曲线'{curve_name}'在不同时间点的值:")
-            for i in range(11):
-                t = i / 10
-                print(f"  t={t:.1f}, value={curve_func(t):.4f}")
+        animation_settings = self.animation_service.get_animation_settings(animation) if animation else None
+        
+        # 加载图像（使用动画服务的缓存，重复生成同一图片的片段时无需重新解码）
+        image = self.animation_service.load_image(image_path)
+        if canvas_size:
+            image = self.fit_image_to_canvas(image, animation_settings, canvas_size)
+        is_static = self.animation_service.is_static_animation(animation_settings)
+        
+        # 缩放到输出分辨率只做一次：静止画面直接缩放图片，动画则合并到每帧的仿射变换中，
+        # 不必在最终合成时再逐帧缩放。带透明通道的图片的遮罩不参与逐帧变换，动画时保持原尺寸
+        output_size = None
+        if canvas_size and (image.shape[1], image.shape[0]) != tuple(canvas_size):
+            if is_static:
+                shrink = canvas_size[0] <= image.shape[1] and canvas_size[1] <= image.shape[0]
+                image = cv2.resize(image, tuple(canvas_size),
+                                   interpolation=cv2.INTER_AREA if shrink else interpolation)
+            elif image.shape[2] == 3:
+                output_size = tuple(canvas_size)
+        image_clip = ImageClip(image).set_duration(duration)
+        
+        # 应用动画效果，静止画面直接使用原始图片，不逐帧变换
+        if not is_static:
+            logger.debug("应用动画效果: %s", animation_settings)
             # 应用动画效果
-            image_clip = self.apply_opencv_animation(image_clip, animation_settings, duration, clip_id)
+            image_clip = self.apply_opencv_animation(image_clip, animation_settings, duration, clip_id,
+                                                     interpolation, output_size)
         
         # 设置音频（如果有）
         if audio_clip:
             # 设置音频
             image_clip = image_clip.set_audio(audio_clip)
-            print(f"已添加音频: {audio_path}, 持续时间: {audio_clip.duration:.2f}s")
+            logger.debug("已添加音频: %s, 持续时间: %.2fs", audio_path, audio_clip.duration)
         
         print(f"===== 片段 {clip_id} (图片: {image_filename}) 创建完成，持续时间: {duration:.2f}s =====\n")
         
         return image_clip
     
-    def apply_opencv_animation(self, clip, animation_params, duration, clip_id=None):
+    def _load_audio_clip(self, audio_path: str) -> AudioFileClip:
+        """
+        打开音频文件，同一个文件在一次视频合成中只打开一次
+        
+        Args:
+            audio_path: 音频文件路径
+            
+        Returns:
+            音频片段
+        """
+        key = (audio_path, os.path.getmtime(audio_path))
+        audio_clip = self._audio_clips.get(key)
+        if audio_clip is None:
+            audio_clip = self._audio_clips[key] = AudioFileClip(audio_path)
+        return audio_clip
+    
+    def _close_audio_clips(self) -> None:
+        """关闭所有已打开的音频，释放ffmpeg读取进程"""
+        for audio_clip in self._audio_clips.values():
+            try:
+                audio_clip.close()
+            except Exception:
+                pass
+        self._audio_clips.clear()
+    
+    def fit_image_to_canvas(self, image: np.ndarray, animation_settings: Optional[Dict],
+                            canvas_size: Tuple[int, int]) -> np.ndarray:
+        """
+        将远大于输出分辨率的图片预先缩小，之后每一帧的动画处理都在较小的图片上进行
+        
+        缩小后的尺寸仍能覆盖动画中最大放大倍数下的输出分辨率，画面细节不会损失
+        
+        Args:
+            image: 原始图片数组
+            animation_settings: 动画设置，为None时按不缩放处理
+            canvas_size: 输出分辨率 (width, height)
+            
+        Returns:
+            缩小后的图片数组，不需要缩小时返回原数组
+        """
+        max_scale = 1.0
+        if animation_settings:
+            scales = animation_settings.get('scale', [1.0, 1.0])
+            positions = animation_settings.get('position', [(0, 0), (0, 0)])
+            max_shift = max(abs(value) for pos in positions for value in pos)
+            # 与逐帧处理一致：有平移时会额外放大以避免露出边缘
+            max_scale = max(scales) * (1.0 + 2 * max_shift)
+        
+        height, width = image.shape[:2]
+        canvas_w, canvas_h = canvas_size
+        # 保持宽高比，缩放后两个方向都不小于最大放大倍数下的输出尺寸，并留出几个像素的余量
+        factor = max((canvas_w * max_scale + 8) / width, (canvas_h * max_scale + 8) / height)
+        if factor >= 1.0:
+            return image
+        
+        # 宽高取偶数，满足yuv420p编码的要求
+        target = (max(2, int(width * factor / 2 + 0.5) * 2), max(2, int(height * factor / 2 + 0.5) * 2))
+        logger.debug("图片尺寸 %dx%d 远大于输出分辨率，预先缩小到 %dx%d", width, height, target[0], target[1])
+        # INTER_AREA是缩小图片时质量最好的插值方式
+        return cv2.resize(image, target, interpolation=cv2.INTER_AREA)
+    
+    def render_clip_to_file(self, item: Union[Dict, ImageItem], output_path: str, codec: str = 'libx264',
+                            canvas_size: Optional[Tuple[int, int]] = None,
+                            interpolation: int = cv2.INTER_LINEAR, preset: str = 'medium',
+                            ffmpeg_params: Optional[List[str]] = None, fps: Optional[int] = None) -> str:
+        """
+        直接将单个图片的动画片段编码为视频文件
+        
+        效果与create_clip相同，但不构建MoviePy片段：逐帧计算动画后直接写入ffmpeg，
+        音频由ffmpeg直接从原始音频文件编码，省去逐帧回调和中间缓冲的开销
+        
+        Args:
+            item: 包含图片路径、持续时间、音频路径、动画效果等
+            output_path: 输出视频文件路径
+            codec: 视频编码器
+            canvas_size: 片段最终输出的分辨率 (width, height)，指定时过大的图片会先缩小
+            interpolation: 动画缩放使用的OpenCV插值方式
+            preset: 编码预设
+            ffmpeg_params: 附加的ffmpeg编码参数
+            fps: 帧率，为None时使用默认帧率
+            
+        Returns:
+            生成的视频文件路径
+        """
+        image_path = item.get("image_path")
+        # 确保路径是字符串
+        if hasattr(image_path, '__fspath__'):
+            image_path = str(image_path)
+        
+        if not os.path.exists(image_path):
+            raise FileNotFoundError(f"图片文件未找到: {image_path}")
+        
+        clip_id = item.get("id", None)
+        image_filename = os.path.splitext(os.path.basename(image_path))[0]
+        print(f"\n===== 开始生成片段 {clip_id} (图片: {image_filename}) =====")
+        
+        # 获取音频时长（如果有音频），只读取文件信息，不解码音频
+        audio_path = item.get("audio_path")
+        if hasattr(audio_path, '__fspath__'):
+            audio_path = str(audio_path)
+        audio_duration = 0
+        if audio_path and os.path.exists(audio_path):
+            audio_duration = self.ffmpeg_service.probe(audio_path).get("duration") or 0
+            logger.debug("检测到音频: %s, 时长: %.2f秒", audio_path, audio_duration)
+        else:
+            audio_path = None
+        
+        # 确定视频片段时长：优先使用音频时长，其次是用户指定时长，最后是默认时长
+        if audio_duration > 0:
+            duration = audio_duration
+        else:
+            duration = item.get("duration", self.default_duration)
+        logger.debug("片段时长: %.2f秒", duration)
+        
+        animation = item.get("animation")
+        animation_settings = self.animation_service.get_animation_settings(animation) if animation else None
+        
+        image = self.animation_service.load_image(image_path)
+        if canvas_size:
+            image = self.fit_image_to_canvas(image, animation_settings, canvas_size)
+        if image.shape[2] == 4:
+            # 与ImageClip一致，透明通道不参与编码
+            image = np.ascontiguousarray(image[:, :, :3])
+        
+        # 静止画面不创建变换函数，每一帧直接写入原始图片
+        transform = None
+        if not self.animation_service.is_static_animation(animation_settings):
+            logger.debug("应用动画效果: %s", animation_settings)
+            transform = self.create_frame_transform(animation_settings, duration, clip_id, interpolation,
+                                                    fps=fps)
+        
+        height, width = image.shape[:2]
+        fps = fps or self.default_fps
+        writer = FFMPEG_VideoWriter(
+            output_path, (width, height), fps,
+            codec=codec,
+            audiofile=audio_path,
+            preset=preset,
+            threads=self.encode_threads,
+            # FFMPEG_VideoWriter默认直接复制音频流，这里改为编码为AAC
+            ffmpeg_params=(['-c:a', 'aac'] if audio_path else []) + list(ffmpeg_params or []) or None
+        )
+        try:
+            frame_count = int(duration * fps)
+            if transform is None:
+                for _ in range(frame_count):
+                    writer.write_frame(image)
+            else:
+                # 下一帧在后台线程中计算，与当前帧写入ffmpeg同时进行；
+                # warpAffine和管道写入都会释放GIL，两者可以真正并行
+                with ThreadPoolExecutor(max_workers=1) as executor:
+                    pending = executor.submit(transform, image, 0.0)
+                    for i in range(frame_count):
+                        frame = pending.result()
+                        if i + 1 < frame_count:
+                            pending = executor.submit(transform, image, (i + 1) / fps)
+                        writer.write_frame(frame)
+        finally:
+            writer.close()
+        
+        print(f"===== 片段 {clip_id} (图片: {image_filename}) 生成完成: {output_path} =====\n")
+        return output_path
+    
+    def apply_opencv_animation(self, clip, animation_params, duration, clip_id=None, interpolation=cv2.INTER_LINEAR,
+                               output_size=None):
         """
         使用OpenCV实现高精度的动画效果（包括缩放和位移）
         
@@ -130,116 +363,160 @@ class VideoService:
             animation_params: 动画参数，包括scale和position
             duration: 动画持续时间
             clip_id: 片段ID，用于日志标识
+            interpolation: OpenCV插值方式
+            output_size: 输出画面尺寸 (width, height)，为None时与原始画面相同
             
         Returns:
             应用了动画效果的视频片段
         """
+        transform = self.create_frame_transform(animation_params, duration, clip_id, interpolation, output_size)
+        
+        # 将处理函数应用到片段
+        return clip.fl(lambda gf, t: transform(gf(t), t))
+    
+    def create_frame_transform(self, animation_params, duration, clip_id=None, interpolation=cv2.INTER_LINEAR,
+                               output_size=None, fps=None):
+        """
+        创建逐帧应用动画效果（缩放和位移）的函数
+        
+        Args:
+            animation_params: 动画参数，包括scale和position
+            duration: 动画持续时间
+            clip_id: 片段ID，用于日志标识
+            interpolation: OpenCV插值方式
+            output_size: 输出画面尺寸 (width, height)，为None时与原始画面相同；
+                缩放到输出尺寸合并在仿射矩阵中，每帧仍只需一次warpAffine
+            fps: 取帧使用的帧率，为None时使用默认帧率
+            
+        Returns:
+            处理函数，参数为(原始帧, 时间)，返回处理后的帧
+        """
         # 从动画参数中获取缩放和位移信息
         start_scale, end_scale = animation_params.get('scale', [1.0, 1.0])
         start_pos, end_pos = animation_params.get('position', [(0, 0), (0, 0)])
-        curve_name = animation_params.get('curve', '线性')
-        
-        # 获取曲线函数
-        curve_func = self.animation_service.get_curve_function(curve_name)
-        
-        # 为日志添加片段ID标识
-        clip_identifier = f"[片段{clip_id}]" if clip_id else ""
-        
-        # 打印更详细的动画参数
-        print(f"\n{clip_identifier}开始处理视频片段，应用动画:")
-        print(f"{clip_identifier}动画时长: {duration:.2f}秒")
-        print(f"{clip_identifier}缩放: 起始={start_scale:.2f} -> 结束={end_scale:.2f}")
-        print(f"{clip_identifier}位移: 起始=({start_pos[0]:.3f}, {start_pos[1]:.3f}) -> 结束=({end_pos[0]:.3f}, {end_pos[1]:.3f})")
-        print(f"{clip_identifier}曲线: '{curve_name}'")
-        
-        # 打印曲线值，用于调试
-        print(f"{clip_identifier}曲线'{curve_name}'在不同时间点的值:")
-        for i in range(11):
-            t = i / 10
-            print(f"{clip_identifier}  t={t:.1f}, value={curve_func(t):.4f}")
-        
-        # 预计算每一帧的参数 - 使用更多的采样点进行过采样，减少抖动
-        # 通过预计算和高精度插值减少抖动
-        frame_count = int(duration * self.default_fps * 3)  # 3倍过采样
-        print(f"{clip_identifier}t=0.00, progress=0.0000, curve_value=0.0000, scale={start_scale:.4f}")
+        # 随机曲线在这里确定下来，整个片段使用同一条曲线
+        curve_name = self.animation_service.resolve_curve_name(animation_params.get('curve', '线性'))
+        clip_settings = {'scale': [start_scale, end_scale], 'position': [start_pos, end_pos], 'curve': curve_name}
+        
+        # 详细的动画参数只在调试日志中输出，关闭调试日志时不做任何格式化
+        if logger.isEnabledFor(logging.DEBUG):
+            # 为日志添加片段ID标识
+            clip_identifier = f"[片段{clip_id}]" if clip_id else ""
+            logger.debug("%s动画时长: %.2f秒", clip_identifier, duration)
+            logger.debug("%s缩放: 起始=%.2f -> 结束=%.2f", clip_identifier, start_scale, end_scale)
+            logger.debug("%s位移: 起始=(%.3f, %.3f) -> 结束=(%.3f, %.3f)", clip_identifier,
+                         start_pos[0], start_pos[1], end_pos[0], end_pos[1])
+            curve_func = self.animation_service.get_curve_function(curve_name)
+            logger.debug("%s曲线'%s'在不同时间点的值: %s", clip_identifier, curve_name,
+                         ", ".join(f"{i / 10:.1f}={curve_func(i / 10):.4f}" for i in range(11)))
+        
+        # 输出帧缓冲区：warpAffine直接写入预先分配的数组，避免每帧重新分配内存。
+        # MoviePy可能在短时间内持有返回的帧，因此轮换使用多个缓冲区，而不是只复用一个
+        frame_buffers = {}
+        
+        def next_buffer(frame, w, h):
+            shape = (h, w) + frame.shape[2:]
+            if frame_buffers.get('shape') != (shape, frame.dtype):
+                frame_buffers['shape'] = (shape, frame.dtype)
+                frame_buffers['ring'] = itertools.cycle([
+                    np.empty(shape, dtype=frame.dtype)
+                    for _ in range(self.frame_buffer_count)
+                ])
+            return next(frame_buffers['ring'])
+        
+        inv_duration = 1.0 / duration if duration > 0 else 0.0
+        fps = fps or self.default_fps
+        # 片段中每一帧的时间，与MoviePy写入视频时取帧的时间一致
+        frame_times = np.arange(int(duration * fps) + 1) / fps
+        
+        def fit_output(matrices, identity, w, h):
+            """将仿射矩阵的输出缩放到输出尺寸"""
+            out_w, out_h = output_size or (w, h)
+            if (out_w, out_h) == (w, h):
+                return matrices, identity
+            scale = np.array([[out_w / w], [out_h / h]], dtype=np.float32)
+            return matrices * scale, np.zeros_like(identity)
+        
+        def frame_matrices(times, w, h):
+            """批量计算给定时间点的仿射矩阵"""
+            progress = np.minimum(1.0, times * inv_duration) if duration > 0 else np.ones_like(times)
+            return fit_output(*self.animation_service.build_affine_stack(clip_settings, progress, w, h), w, h)
+        
+        # 所有帧的仿射矩阵在第一次取帧时按画面尺寸一次性计算好
+        matrix_table = {}
+        
+        # 使用CUDA或OpenCL时源图片只上传一次，之后每帧直接在设备上缩放
+        use_cuda = {'enabled': self.animation_service.use_cuda}
+        cuda_source = {}
+        use_opencl = self.animation_service.use_opencl and cv2.ocl.useOpenCL()
+        opencl_source = {}
+        
+        def warp_cuda(frame, matrix, w, h):
+            if cuda_source.get('frame') is not frame:
+                cuda_source['frame'] = frame
+                cuda_source['src'] = cv2.cuda_GpuMat()
+                cuda_source['src'].upload(frame)
+                cuda_source['dst'] = cv2.cuda_GpuMat(h, w, cuda_source['src'].type())
+            cv2.cuda.warpAffine(cuda_source['src'], matrix, (w, h), dst=cuda_source['dst'],
+                                flags=interpolation, borderMode=cv2.BORDER_REFLECT)
+            return cuda_source['dst'].download(dst=next_buffer(frame, w, h))
         
         # 定义处理函数
-        def process_frame(get_frame, t):
-            # 获取原始帧
-            frame = get_frame(t)
-            
-            # 计算动画进度
-            progress = min(1.0, t / duration) if duration > 0 else 1.0
-            
-            # 使用曲线函数获取动画曲线值
-            curve_value = curve_func(progress)
-            
-            # 计算当前缩放值
-            current_scale = start_scale + (end_scale - start_scale) * curve_value
-            
-            # 计算当前位移
-            start_x, start_y = start_pos
-            end_x, end_y = end_pos
-            current_x = start_x + (end_x - start_x) * curve_value
-            current_y = start_y + (end_y - start_y) * curve_value
-            
-            # 如果是第一次处理该时间点，打印调试信息
-            if int(t * 100) % 3 == 0:  # 每0.03秒打印一次
-                print(f"{clip_identifier}t={t:.2f}, progress={progress:.4f}, curve_value={curve_value:.4f}, scale={current_scale:.4f}, pos=({current_x:.4f}, {current_y:.4f})")
-            
-            # 使用OpenCV进行高质量缩放和移动
+        def process_frame(frame, t):
             h, w = frame.shape[:2]
-            
-            # 计算平移后是否会有黑边
-            max_x_shift = abs(current_x)
-            max_y_shift = abs(current_y)
-            
-            # 如果有平移，增加缩放以防止黑边
-            if max_x_shift > 0 or max_y_shift > 0:
-                # 计算需要增加的缩放比例，确保移动后不会露出黑边
-                border_scale = max(1.0, 1.0 + 2 * max_x_shift, 1.0 + 2 * max_y_shift)
-                # 合并当前缩放和防黑边缩放
-                effective_scale = current_scale * border_scale
-                
-                # 调整缩放矩阵
-                M_scale = np.float32([
-                    [effective_scale, 0, w * (1 - effective_scale) / 2],
-                    [0, effective_scale, h * (1 - effective_scale) / 2]
-                ])
+            if matrix_table.get('size') != (w, h):
+                matrix_table['size'] = (w, h)
+                matrix_table['matrices'], matrix_table['identity'] = frame_matrices(frame_times, w, h)
+            
+            position = t * fps
+            index = int(round(position))
+            if index < len(frame_times) and abs(position - index) < 1e-6:
+                matrix = matrix_table['matrices'][index]
+                identity = matrix_table['identity'][index]
             else:
-                # 没有平移，使用原始缩放
-                M_scale = np.float32([
-                    [current_scale, 0, w * (1 - current_scale) / 2],
-                    [0, current_scale, h * (1 - current_scale) / 2]
-                ])
-            
-            # 计算位移矩阵
-            M_translate = np.float32([
-                [1, 0, current_x * w],
-                [0, 1, current_y * h]
-            ])
-            
-            # 应用缩放
-            if current_scale != 1.0:
-                frame = cv2.warpAffine(frame, M_scale, (w, h), flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REFLECT)
-            
-            # 应用位移
-            if current_x != 0 or current_y != 0:
-                frame = cv2.warpAffine(frame, M_translate, (w, h), flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REFLECT)
-            
-            return frame
-        
-        # 将处理函数应用到片段
-        return clip.fl(lambda gf, t: process_frame(gf, t))
+                # 不在帧时间上的时刻（如转场或预览时取帧）单独计算
+                progress = min(1.0, t * inv_duration) if duration > 0 else 1.0
+                matrix, identity = fit_output(*self.animation_service.compose_matrix(clip_settings, progress, w, h), w, h)
+            
+            if identity:
+                # 没有任何变换，直接返回原始帧
+                return frame
+            
+            # 使用OpenCV进行高质量缩放和移动，直接输出为输出尺寸
+            w, h = output_size or (w, h)
+            if use_cuda['enabled']:
+                try:
+                    return warp_cuda(frame, matrix, w, h)
+                except cv2.error as e:
+                    # CUDA不支持当前的图像格式或显存不足时改用CPU处理；只记录一次，
+                    # 本片段之后的帧和之后的片段都不再尝试CUDA
+                    logger.warning("CUDA处理失败，改用CPU: %s", e)
+                    use_cuda['enabled'] = False
+                    self.animation_service.use_cuda = False
+                    cuda_source.clear()
+            if use_opencl:
+                if opencl_source.get('frame') is not frame:
+                    opencl_source['frame'] = frame
+                    opencl_source['umat'] = cv2.UMat(frame)
+                    # 设备端的输出缓冲区只分配一次，每帧直接写入
+                    opencl_source['dst'] = cv2.UMat(h, w, cv2.CV_8UC(frame.shape[2]))
+                cv2.warpAffine(opencl_source['umat'], matrix, (w, h), dst=opencl_source['dst'],
+                               flags=interpolation, borderMode=cv2.BORDER_REFLECT)
+                # Python绑定中UMat.get()不能指定输出数组，下载到内存时总会分配新的数组，
+                # 因此OpenCL路径不使用帧缓冲区
+                return opencl_source['dst'].get()
+            return cv2.warpAffine(frame, matrix, (w, h), dst=next_buffer(frame, w, h), flags=interpolation, borderMode=cv2.BORDER_REFLECT)
+        
+        return process_frame
     
-    def create_video(self, items: List[dict], output_path: str, 
+    def create_video(self, items: List[Union[Dict, ImageItem]], output_path: str, 
                     transition: str = "淡入淡出", transition_duration: float = 0.7,
                     advanced_options: Optional[Dict] = None) -> str:
         """
         创建完整视频，支持多种转场效果和高级设置
         
         Args:
-            items: 包含图片、音频和动画设置的项目列表
+            items: 包含图片、音频和动画设置的项目列表（字典或ImageItem）
             output_path: 输出视频文件路径
             transition: 转场效果名称
             transition_duration: 转场效果持续时间（秒）
@@ -248,6 +525,7 @@ class VideoService:
                 - custom_transitions: 自定义转场列表，与项目数量-1对应
                 - video_resolution: 视频分辨率 (width, height)
                 - output_quality: 输出质量 (low, medium, high)
+                - resample: 动画缩放的插值方式 (linear, cubic, lanczos)，未指定时由输出质量决定
         
         Returns:
             生成的视频文件路径
@@ -261,6 +539,13 @@ class VideoService:
         custom_transitions = advanced_options.get('custom_transitions', [])
         video_resolution = advanced_options.get('video_resolution', None)
         output_quality = advanced_options.get('output_quality', 'medium')
+        # 只有高质量输出默认使用双三次插值，也可以通过resample单独指定
+        interpolation = RESAMPLE_INTERPOLATION.get(
+            advanced_options.get('resample'),
+            ANIMATION_INTERPOLATION["high" if output_quality == "high" else "preview"]
+        )
+        # 根据质量设置输出码率
+        bitrate = OUTPUT_BITRATES.get(output_quality)
         
         # 生成基于日期时间的视频文件名
         now = datetime.datetime.now()
@@ -297,6 +582,20 @@ class VideoService:
                 print(f"使用自定义转场: {custom_transitions}")
             print("="*50 + "\n")
             
+            # 所有转场都能由ffmpeg滤镜实现时，各片段在多个进程中同时渲染为独立的视频文件，
+            # 再由一个ffmpeg进程完成缩放、转场和拼接，不在一个进程中逐帧合成整个视频
+            transition_names = self._resolve_transition_names(
+                len(items), transition, transition_duration, use_custom_transitions, custom_transitions
+            )
+            if self.ffmpeg_service.supports_transitions(transition_names):
+                try:
+                    return self._create_video_from_segments(
+                        items, output_path, transition_names, transition_duration,
+                        bitrate, video_resolution, interpolation
+                    )
+                except Exception as e:
+                    print(f"并行生成视频失败，改用MoviePy合成: {str(e)}")
+            
             # 创建每个片段
             print(f"正在处理 {len(items)} 个视频片段...")
             for i, item in enumerate(items):
@@ -304,14 +603,15 @@ class VideoService:
                 print(f"创建片段 {i+1}/{len(items)}...")
                 
                 # 检查是否需要先生成音频（如果有文本但没有音频）
-                if 'text' in item and item['text'] and ('audio_path' not in item or not item['audio_path']):
+                if item.get('text') and not item.get('audio_path'):
                     # 需要先生成音频，这部分会在controller层实现
                     print(f"片段 {i+1} 有文本但无音频，将由控制器处理")
                 
-                clip = self.create_clip(item)
+                # 指定了视频分辨率时，片段直接按该分辨率生成，过大的图片也会先缩小，减少逐帧处理的数据量
+                clip = self.create_clip(item, canvas_size=video_resolution, interpolation=interpolation)
                 
-                # 如果指定了视频分辨率，调整所有片段的尺寸
-                if video_resolution:
+                # 片段未能直接生成为指定分辨率时（如带透明通道的动画图片），再逐帧调整尺寸
+                if video_resolution and tuple(clip.size) != tuple(video_resolution):
                     clip = clip.resize(video_resolution)
                     print(f"已调整片段 {i+1} 的分辨率为 {video_resolution[0]}x{video_resolution[1]}")
                 
@@ -327,40 +627,22 @@ class VideoService:
                 print(f"片段 {i+1} ({image_filename}) 创建完成，持续时间: {clip.duration:.2f}秒")
                 print(f"{'*'*30}\n")
             
-            # 应用过渡效果
-            if len(clips) > 1 and (transition or use_custom_transitions):
+            # 应用过渡效果：使用上面已经确定的转场效果，随机转场不会重新选择，与日志中输出的一致
+            if len(clips) > 1 and any(name != "无" for name in transition_names):
                 print("\n" + "-"*40)
-                print("开始应用转场效果...")
-                # 使用新的转场服务
-                if use_custom_transitions and custom_transitions:
-                    # 创建一个合成视频，其中包含定制的转场效果
-                    print(f"应用自定义转场效果: {custom_transitions}")
-                    final_clip = self.transition_service.create_composite_transition(
-                        clips, 
-                        transition, 
-                        transition_duration,
-                        custom_transitions
-                    )
-                else:
-                    # 应用常规的转场效果
-                    print(f"应用转场效果: {transition}，时长: {transition_duration}秒")
-                    clips = self.transition_service.apply_transitions_to_clips(
-                        clips, 
-                        transition, 
-                        transition_duration,
-                        use_custom_transitions,
-                        custom_transitions
-                    )
-                    
-                    # 将所有片段连接起来
-                    print("合并所有视频片段...")
-                    final_clip = concatenate_videoclips(clips, method="compose")
+                print(f"开始应用转场效果: {transition_names}，时长: {transition_duration}秒")
+                final_clip = self.transition_service.create_composite_transition(
+                    clips,
+                    transition,
+                    transition_duration,
+                    transition_names
+                )
                 print(f"转场效果应用完成，最终视频时长: {final_clip.duration:.2f}秒")
                 print("-"*40 + "\n")
             else:
                 # 无转场效果，直接连接
                 print("合并所有视频片段（无转场）...")
-                final_clip = concatenate_videoclips(clips, method="compose")
+                final_clip = concatenate_clips(clips)
             
             # 检查最后一个片段是否有音频，如果有，确保视频长度不会导致音频被截断
             if len(original_clips) > 0 and original_clips[-1].audio is not None:
@@ -387,17 +669,12 @@ class VideoService:
                     padding_clip = ImageClip(last_frame).set_duration(padding_duration)
                     
                     # 将延长片段添加到视频末尾
-                    final_clip = concatenate_videoclips([final_clip, padding_clip], method="compose")
+                    final_clip = concatenate_clips([final_clip, padding_clip])
                     print(f"视频已延长，新时长: {final_clip.duration:.2f}秒")
             
-            # 根据质量设置输出参数
-            bitrate = None
-            if output_quality == 'low':
-                bitrate = '1000k'
-            elif output_quality == 'medium':
-                bitrate = '2500k'
-            elif output_quality == 'high':
-                bitrate = '5000k'
+            # 有硬件编码器时使用硬件编码，否则使用libx264
+            codec = self.ffmpeg_service.get_h264_encoder()
+            preset, encoder_params = self.ffmpeg_service.get_encoder_settings(codec)
             
             print(f"\n正在导出视频到 {output_path}...")
             if bitrate:
@@ -406,11 +683,13 @@ class VideoService:
             # 写入视频文件
             final_clip.write_videofile(
                 output_path,
-                codec='libx264',
+                codec=codec,
                 audio_codec='aac',
                 bitrate=bitrate,
                 fps=self.default_fps,
-                threads=4
+                threads=4,
+                preset=preset,
+                ffmpeg_params=encoder_params or None
             )
             
             print("清理临时资源...")
@@ -437,50 +716,131 @@ class VideoService:
             print(f"生成视频时出错: {str(e)}")
             traceback.print_exc()
             raise
+        finally:
+            self._close_audio_clips()
     
-    def preview_clip(self, item: dict, output_filename: str) -> str:
-        """预览单个片段"""
-        try:
-            # 确保item中的路径是字符串
-            preview_item = item.copy()
+    def _resolve_transition_names(self, clip_count: int, transition: str, transition_duration: float,
+                                  use_custom_transitions: bool, custom_transitions: List[str]) -> List[str]:
+        """
+        确定每个连接点实际使用的转场效果，随机转场在这里解析为具体效果
+        
+        Args:
+            clip_count: 片段数量
+            transition: 默认转场效果名称
+            transition_duration: 转场持续时间
+            use_custom_transitions: 是否使用自定义转场
+            custom_transitions: 自定义转场列表，数量不足时使用默认转场
             
-            if "image_path" in preview_item and hasattr(preview_item["image_path"], '__fspath__'):
-                preview_item["image_path"] = str(preview_item["image_path"])
-                
-            if "audio_path" in preview_item and preview_item["audio_path"] and hasattr(preview_item["audio_path"], '__fspath__'):
-                preview_item["audio_path"] = str(preview_item["audio_path"])
+        Returns:
+            每个连接点的转场效果名称，数量为片段数减一
+        """
+        names = []
+        for i in range(clip_count - 1):
+            name = transition or "无"
+            if use_custom_transitions and custom_transitions and i < len(custom_transitions):
+                name = custom_transitions[i]
+            # 转场时长不大于0时不会产生任何转场画面，等同于无转场
+            names.append(self.transition_service.resolve_transition_name(name) if transition_duration > 0 else "无")
+        return names
+    
+    def _create_video_from_segments(self, items: List[Union[Dict, ImageItem]], output_path: str,
+                                    transition_names: List[str], transition_duration: float,
+                                    bitrate: Optional[str], video_resolution: Optional[Tuple[int, int]],
+                                    interpolation: int) -> str:
+        """
+        将每个项目并行渲染为独立的视频文件，再由ffmpeg一次完成缩放、转场和拼接
+        
+        各片段的编码互不相关，多个进程可以同时进行；中间文件在合并后删除
+        
+        Args:
+            items: 包含图片、音频和动画设置的项目列表
+            output_path: 输出视频文件路径
+            transition_names: 每个连接点的转场效果名称，必须都能由ffmpeg滤镜实现
+            transition_duration: 转场持续时间
+            bitrate: 视频码率，为None时使用中等质量的码率
+            video_resolution: 输出分辨率，为None时使用所有片段中最大的宽高
+            interpolation: 动画缩放使用的OpenCV插值方式
             
+        Returns:
+            生成的视频文件路径
+        """
+        output_dir = os.path.dirname(os.path.abspath(output_path))
+        with tempfile.TemporaryDirectory(prefix="segments_", dir=output_dir) as segment_dir:
+            segment_paths = [os.path.join(segment_dir, f"seg_{i:03d}.mp4") for i in range(len(items))]
+            
+            workers = min(len(items), MAX_SEGMENT_WORKERS)
+            print(f"正在使用 {workers} 个进程生成 {len(items)} 个视频片段...")
+            if workers == 1:
+                for item, segment_path in zip(items, segment_paths):
+                    render_segment(item, segment_path, video_resolution, interpolation, self)
+            else:
+                # 使用spawn启动工作进程，避免fork带有界面线程的进程
+                with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                         initializer=init_render_worker, initargs=(workers,)) as executor:
+                    list(executor.map(
+                        render_segment, items, segment_paths,
+                        itertools.repeat(video_resolution), itertools.repeat(interpolation)
+                    ))
+            
+            print(f"\n使用ffmpeg合并视频片段到 {output_path}...")
+            self.ffmpeg_service.merge_videos(
+                segment_paths,
+                output_path,
+                transition_names,
+                transition_duration,
+                bitrate or OUTPUT_BITRATES["medium"],
+                resolution=video_resolution,
+                fps=self.default_fps
+            )
+        
+        print(f"视频生成完成: {output_path}")
+        print("="*50 + "\n")
+        return output_path
+    
+    def preview_clip(self, item: Union[Dict, ImageItem], output_filename: str, quality: str = "preview") -> str:
+        """
+        生成单个片段的视频文件，用于预览
+        
+        Args:
+            item: 包含图片路径、持续时间、音频路径、动画效果等
+            output_filename: 输出文件名，为空时自动生成
+            quality: 动画质量，"preview"使用双线性插值并以较低帧率快速编码，"high"使用双三次插值
+            
+        Returns:
+            生成的视频文件路径
+        """
+        try:
             # 使用图片文件名作为输出文件名的一部分
-            image_path = preview_item.get("image_path", "")
-            image_filename = os.path.splitext(os.path.basename(image_path))[0] if image_path else "clip"
+            image_path = item.get("image_path", "")
+            image_filename = os.path.splitext(os.path.basename(str(image_path)))[0] if image_path else "clip"
             
             # 创建基于图片名称的输出文件名
             if not output_filename:
                 output_filename = f"preview_{image_filename}_{uuid.uuid4()}.mp4"
             
-            # 创建片段
-            clip = self.create_clip(preview_item)
-            
-            # 获取视频目录
+            # 获取视频目录（由PathService在初始化时创建）
             video_dir = self.path_service.video_directory
-            video_dir.mkdir(parents=True, exist_ok=True)
             output_path = video_dir / output_filename
             
-            # 写入预览文件
-            clip.write_videofile(
-                str(output_path), 
-                codec='libx264',
-                fps=self.default_fps,
-                threads=min(4, os.cpu_count() or 2),
-                preset='medium',
-                audio_codec='aac' if clip.audio is not None else None
+            # 有硬件编码器时使用硬件编码，否则使用libx264
+            codec = self.ffmpeg_service.get_h264_encoder()
+            preset, encoder_params = self.ffmpeg_service.get_encoder_settings(codec)
+            fps = None
+            if quality == "preview":
+                # 预览质量降低帧率；libx264使用最快的预设，硬件编码器本身已经足够快
+                fps = PREVIEW_FPS
+                if codec == "libx264":
+                    preset, encoder_params = PREVIEW_PRESET, PREVIEW_FFMPEG_PARAMS
+            
+            # 生成片段并直接写入预览文件
+            return self.render_clip_to_file(
+                item, str(output_path),
+                codec=codec,
+                interpolation=ANIMATION_INTERPOLATION.get(quality, cv2.INTER_LINEAR),
+                preset=preset,
+                ffmpeg_params=encoder_params,
+                fps=fps
             )
-            
-            # 关闭剪辑
-            clip.close()
-            
-            # 返回预览文件路径
-            return str(output_path)
         except Exception as e:
             raise Exception(f"生成预览失败: {str(e)}")
     
@@ -496,4 +856,73 @@ class VideoService:
             return True
         except Exception as e:
             print(f"打开文件失败: {str(e)}")
-            return False 
\ No newline at end of file
+            return False
+
+
+# 工作进程中复用的视频服务实例
+_worker_video_service = None
+
+def init_render_worker(workers: int) -> None:
+    """
+    渲染进程池中工作进程的初始化函数，作为ProcessPoolExecutor的initializer使用
+    
+    多个进程同时渲染时，每个进程的OpenCV线程和ffmpeg编码线程只使用平分后的CPU核心，
+    避免进程数 × 每进程线程数远超核心数
+    
+    Args:
+        workers: 进程池中的进程数
+    """
+    global _worker_video_service
+    threads = max(1, (os.cpu_count() or 2) // max(1, workers))
+    _worker_video_service = VideoService(threads=threads)
+
+def render_preview_clip(item: Union[Dict, ImageItem], output_filename: str, quality: str = "preview") -> str:
+    """
+    在工作进程中生成单个片段的视频文件
+    
+    作为模块级函数可以直接提交给ProcessPoolExecutor，每个进程只创建一次VideoService
+    
+    Args:
+        item: 包含图片路径、持续时间、音频路径、动画效果等
+        output_filename: 输出文件名或路径
+        quality: 动画质量，"preview"或"high"
+        
+    Returns:
+        生成的视频文件路径
+    """
+    global _worker_video_service
+    if _worker_video_service is None:
+        _worker_video_service = VideoService()
+    return _worker_video_service.preview_clip(item, output_filename, quality)
+
+
+def render_segment(item: Union[Dict, ImageItem], output_path: str,
+                   canvas_size: Optional[Tuple[int, int]], interpolation: int,
+                   video_service: Optional[VideoService] = None) -> str:
+    """
+    将单个项目渲染为用于最终合并的中间视频文件
+    
+    作为模块级函数可以直接提交给ProcessPoolExecutor，每个进程只创建一次VideoService
+    
+    Args:
+        item: 包含图片路径、持续时间、音频路径、动画效果等
+        output_path: 输出视频文件路径
+        canvas_size: 最终输出的分辨率 (width, height)，为None时不预先缩小图片
+        interpolation: 动画缩放使用的OpenCV插值方式
+        video_service: 使用的视频服务，为None时使用工作进程中复用的实例
+        
+    Returns:
+        生成的视频文件路径
+    """
+    global _worker_video_service
+    if video_service is None:
+        if _worker_video_service is None:
+            _worker_video_service = VideoService()
+        video_service = _worker_video_service
+    return video_service.render_clip_to_file(
+        item, output_path,
+        canvas_size=canvas_size,
+        interpolation=interpolation,
+        preset=SEGMENT_PRESET,
+        ffmpeg_params=SEGMENT_FFMPEG_PARAMS
+    )
@@ -145,7 +145,7 @@ class MainWindow(QMainWindow):
         image_layout = QVBoxLayout(image_container)
         
         # 图片名称
-        name_label = QLabel(item.image_path.name)
+        name_label = QLabel(item.image_name)
         name_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
         image_layout.addWidget(name_label)
         
@@ -337,7 +337,7 @@ class MainWindow(QMainWindow):
             # 检查是否已生成该片段
             if self.video_controller.is_clip_generated(item):
                 # 如果已生成，显示使用已有片段的消息
-                clip_path = self.video_controller.generated_clips[str(item.image_path)]
+                clip_path = self.video_controller.generated_clips[item.image_key]
                 self.statusBar().showMessage(f"使用已生成的片段：{clip_path}")
             else:
                 # 如果未生成，则生成新片段
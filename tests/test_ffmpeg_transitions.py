@@ -0,0 +1,61 @@
+"""ffmpeg合并路径的转场效果应与MoviePy路径（TransitionService）一致"""
+import numpy as np
+import pytest
+from moviepy.editor import ImageClip, VideoFileClip
+from moviepy.video.io.ffmpeg_writer import FFMPEG_VideoWriter
+
+from src.services.ffmpeg_service import FFmpegService
+from src.services.transition_service import TransitionService
+
+WIDTH, HEIGHT = 160, 96
+FPS = 30
+CLIP_DURATION = 2.0
+TRANSITION_DURATION = 1.0
+
+
+def _gradient_frames():
+    """两张带横纵渐变的图片，画面移动（推出或覆盖）时像素会明显不同"""
+    x = np.broadcast_to(np.linspace(0, 255, WIDTH)[None, :], (HEIGHT, WIDTH))
+    y = np.broadcast_to(np.linspace(0, 255, HEIGHT)[:, None], (HEIGHT, WIDTH))
+    frame1 = np.stack([x, y, np.full((HEIGHT, WIDTH), 40)], axis=2).astype(np.uint8)
+    frame2 = np.stack([np.full((HEIGHT, WIDTH), 200), 255 - x, 255 - y], axis=2).astype(np.uint8)
+    return frame1, frame2
+
+
+def _write_still_video(path, frame):
+    """将静止画面无损编码为视频文件"""
+    writer = FFMPEG_VideoWriter(str(path), (WIDTH, HEIGHT), FPS, codec='libx264', ffmpeg_params=['-crf', '0'])
+    try:
+        for _ in range(int(CLIP_DURATION * FPS)):
+            writer.write_frame(frame)
+    finally:
+        writer.close()
+
+
+@pytest.mark.parametrize("name", sorted(FFmpegService.XFADE_TRANSITIONS))
+def test_xfade_transition_matches_moviepy(tmp_path, name):
+    frame1, frame2 = _gradient_frames()
+    video_paths = [tmp_path / "clip1.mp4", tmp_path / "clip2.mp4"]
+    _write_still_video(video_paths[0], frame1)
+    _write_still_video(video_paths[1], frame2)
+
+    output_path = tmp_path / "merged.mp4"
+    FFmpegService().merge_videos(
+        [str(path) for path in video_paths], str(output_path), [name], TRANSITION_DURATION, '20000k'
+    )
+
+    transition_clip = TransitionService().transitions[name](
+        ImageClip(frame1).set_duration(CLIP_DURATION),
+        ImageClip(frame2).set_duration(CLIP_DURATION),
+        TRANSITION_DURATION
+    )
+    merged = VideoFileClip(str(output_path))
+    try:
+        # 转场从第二个片段开始处进行，比较转场中的几帧
+        for t in (0.2, 0.5, 0.8):
+            expected = transition_clip.get_frame(t).astype(np.int16)
+            actual = merged.get_frame(CLIP_DURATION + t).astype(np.int16)
+            # 允许编码和色彩空间转换带来的少量误差
+            assert np.abs(actual - expected).mean() < 5, f"{name} 在转场进度 {t} 处与MoviePy不一致"
+    finally:
+        merged.close()